@@ -0,0 +1,151 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import Counter
+
+# Admission limits for /analyze (overridable through the environment); a rate of 0 disables that limit
+ADMISSION_IP_PER_MINUTE = float(os.environ.get('ADMISSION_IP_PER_MINUTE', 10))
+ADMISSION_IP_BURST = int(os.environ.get('ADMISSION_IP_BURST', 5))
+ADMISSION_EMAIL_PER_HOUR = float(os.environ.get('ADMISSION_EMAIL_PER_HOUR', 20))
+ADMISSION_EMAIL_BURST = int(os.environ.get('ADMISSION_EMAIL_BURST', 3))
+# Clients tracked per limiter; the least recently seen are forgotten first
+ADMISSION_MAX_CLIENTS = int(os.environ.get('ADMISSION_MAX_CLIENTS', 10000))
+# Reverse proxies in front of the app (1 on Railway/Heroku) whose
+# X-Forwarded-For entry can be trusted; 0 uses the socket's peer address
+TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 0))
+
+admission_rejected = Counter('webanalyzer_admission_rejected_total', 'Requests turned away by admission control', ['reason'])
+admission_deduplicated = Counter('webanalyzer_admission_deduplicated_total',
+                                 'Submissions answered with an identical job already in flight')
+
+
+class RateLimiter:
+    """Token buckets keyed by client.
+
+    Each key holds up to ``burst`` tokens and regains ``rate`` tokens per
+    second. Buckets live in an LRU of at most ``max_keys`` entries, so
+    memory stays bounded however many distinct clients show up; a forgotten
+    client simply starts again with a full bucket.
+    """
+
+    def __init__(self, rate, burst, max_keys=ADMISSION_MAX_CLIENTS):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated)
+        self._lock = threading.Lock()
+
+    def acquire(self, key):
+        """Take a token for ``key``; returns 0 on success, else seconds until one is available"""
+        if self.rate <= 0:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class InFlight:
+    """Jobs currently queued or running, keyed so identical submissions share one job.
+
+    ``is_active(job_id)``, if given, is asked before an entry is reused, so
+    jobs that finished without calling release() (run by another process,
+    or lost with one) stop being shared. Such entries are also pruned as
+    new ones are added, so the map stays about as large as the queue.
+    """
+
+    def __init__(self, is_active=None):
+        self.is_active = is_active
+        self._jobs = {}
+        self._prune_at = 64
+        self._lock = threading.Lock()
+
+    def _current(self, key):
+        job_id = self._jobs.get(key)
+        if job_id is not None and self.is_active and not self.is_active(job_id):
+            del self._jobs[key]
+            return None
+        return job_id
+
+    def get(self, key):
+        with self._lock:
+            return self._current(key)
+
+    def submit(self, key, submit):
+        """Return (job_id, True) after calling ``submit()`` for a new key, or
+        (existing job_id, False) if the same key is already in flight.
+        QueueFull from ``submit`` propagates with nothing recorded."""
+        with self._lock:
+            job_id = self._current(key)
+            if job_id is not None:
+                return job_id, False
+            job = submit()
+            self._jobs[key] = job.id
+            self._prune()
+            return job.id, True
+
+    def _prune(self):
+        # Sweeps only when the map has doubled since the last sweep, so the
+        # is_active checks cost O(1) per insert on average
+        if not self.is_active or len(self._jobs) < self._prune_at:
+            return
+        self._jobs = {key: job_id for key, job_id in self._jobs.items() if self.is_active(job_id)}
+        self._prune_at = max(64, 2 * len(self._jobs))
+
+    def release(self, key, job_id):
+        with self._lock:
+            if self._jobs.get(key) == job_id:
+                del self._jobs[key]
+
+    def __len__(self):
+        return len(self._jobs)
+
+
+def retry_after(seconds):
+    """Whole seconds for a Retry-After header"""
+    return max(1, math.ceil(seconds))
+
+
+class AdmissionControl:
+    """Rate limits per client IP and per recipient, plus in-flight dedup, for /analyze"""
+
+    def __init__(self, is_active=None):
+        self.by_ip = RateLimiter(ADMISSION_IP_PER_MINUTE / 60, ADMISSION_IP_BURST)
+        self.by_email = RateLimiter(ADMISSION_EMAIL_PER_HOUR / 3600, ADMISSION_EMAIL_BURST)
+        self.in_flight = InFlight(is_active)
+
+    def check(self, ip, email):
+        """None if the request may proceed, else (reason, seconds to wait); ``email`` may be None"""
+        wait = self.by_ip.acquire(ip)
+        if wait:
+            admission_rejected.inc(reason='ip')
+            return 'ip', retry_after(wait)
+        wait = self.by_email.acquire(email) if email else 0
+        if wait:
+            admission_rejected.inc(reason='email')
+            return 'email', retry_after(wait)
+        return None
+
+
+def client_ip(request):
+    """The requesting client's address, looking through TRUSTED_PROXIES reverse proxies"""
+    if TRUSTED_PROXIES:
+        forwarded = [hop.strip() for hop in request.headers.get('X-Forwarded-For', '').split(',') if hop.strip()]
+        if len(forwarded) >= TRUSTED_PROXIES:
+            return forwarded[-TRUSTED_PROXIES]
+    return request.remote_addr or 'unknown'
@@ -1,28 +1,34 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory
 from flask_cors import CORS
-import requests
-from bs4 import BeautifulSoup
 import smtplib
+from concurrent.futures import TimeoutError as FutureTimeout
 from email.message import EmailMessage
-import time
 import os
 import socket
-import io
-from concurrent.futures import ThreadPoolExecutor
-import matplotlib.pyplot as plt
-import matplotlib
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Image
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-from PIL import Image as PILImage
-import tempfile
+import json
+import logging
 from datetime import datetime
-
-# Use non-interactive backend for matplotlib
-matplotlib.use('Agg')
+from fetcher import fetch_page, normalize_scheme, normalize_url, permanent_failure
+from extractor import extract_seo, iter_decoded
+from cache import make_cache
+from jobs import QueueFull, make_job_queue
+from singleflight import SingleFlight
+from admission import AdmissionControl, admission_deduplicated, admission_rejected, client_ip, retry_after
+import threading
+from render_pool import PDF_WARM_START, render_pdf, warm_start
+from report_index import ReportIndex, normalize_recipient, report_filename
+from history import HISTORY_ENABLED, HistoryStore
+import metrics
+from metrics import Counter, Gauge, stage_errors, timed
+from mailer import SMTP_FROM, SMTP_RETRIES, SMTP_TIMEOUT, make_dispatcher
+from latency import sample_count, sample_latency
+from scoring import blend_page_weight, compute_performance_score
+from page_weight import PERFORMANCE_MODE, analyze_page_weight, page_weight_score
+from crawler import CRAWL_MAX_DEPTH, CRAWL_MAX_PAGES, SiteCrawler
+from batch import BatchError, clean_urls, generate_batch_report, parse_urls_file, run_batch, summarize
+
+# Modules that log (rather than print) write plain lines to stderr
+logging.basicConfig(level=logging.INFO, format='%(message)s')
 
 print("="*50)
 print("WEBANALYZER BACKEND STARTING UP")
@@ -55,87 +61,207 @@ except Exception as e:
     print(f"✗ Error initializing Flask app: {e}")
     raise
 
-# Executor for background tasks (email sending)
-executor = ThreadPoolExecutor(max_workers=2)
+# Bounded worker pool for analysis jobs (fetch, PDF build, emails); by
+# default the queue is on disk, so pending jobs survive restarts and can
+# also be run by separate worker.py processes. Failures a retry can't fix
+# (unknown host, bad URL, oversized page) aren't retried
+job_queue = make_job_queue(is_permanent=permanent_failure)
+print(f"Job queue: {type(job_queue).__name__}, {job_queue.workers} workers")
+# Per-IP and per-recipient rate limits and in-flight dedup for /analyze
+admission = AdmissionControl(job_queue.is_active)
 
-REPORTS_DIR = os.path.join(os.path.dirname(__file__), 'reports')
+REPORTS_DIR = os.environ.get('REPORTS_DIR') or os.path.join(os.path.dirname(__file__), 'reports')
 if not os.path.exists(REPORTS_DIR):
     os.makedirs(REPORTS_DIR)
     print(f"✓ Created reports directory: {REPORTS_DIR}")
 else:
     print(f"✓ Reports directory exists: {REPORTS_DIR}")
+report_index = ReportIndex(REPORTS_DIR)
+mailer = make_dispatcher()
+
+# Every fresh analysis, for per-site trends
+history = HistoryStore() if HISTORY_ENABLED else None
+print(f"History store: {history.path if history else 'disabled'}")
+# Trend window shown in PDF reports
+HISTORY_REPORT_DAYS = int(os.environ.get('HISTORY_REPORT_DAYS', 90))
+# Size of the pieces /report streams a PDF in
+REPORT_CHUNK_SIZE = int(os.environ.get('REPORT_CHUNK_SIZE', 64 * 1024))
+
+# Cache of recent analysis results, keyed by normalized URL
+result_cache = make_cache()
+# Merges concurrent analyses of the same URL that the cache can't answer yet
+analysis_flight = SingleFlight('analyze')
+print(f"Result cache: {type(result_cache.backend).__name__ if result_cache else 'disabled'}")
+
+# Scrape-time views of state owned by the queues and the cache
+Gauge('webanalyzer_job_queue_depth', 'Jobs waiting for a worker', callback=job_queue.depth)
+Gauge('webanalyzer_jobs_in_flight', 'Jobs currently running', callback=job_queue.running)
+Gauge('webanalyzer_analyses_in_flight', 'Distinct URLs being analyzed right now', callback=analysis_flight.in_flight)
+Gauge('webanalyzer_email_queue_depth', 'Emails waiting to be sent', callback=mailer.depth)
+if result_cache:
+    Counter('webanalyzer_cache_hits_total', 'Analyses served fresh from the cache', callback=lambda: result_cache.hits)
+    Counter('webanalyzer_cache_misses_total', 'Analyses not served from the cache', callback=lambda: result_cache.misses)
+    Counter('webanalyzer_cache_revalidated_total', 'Stale analyses reused after a 304', callback=lambda: result_cache.revalidated)
+    Gauge('webanalyzer_cache_hit_ratio', 'Share of lookups answered from the cache, including 304 revalidations',
+          callback=lambda: ((result_cache.hits + result_cache.revalidated) / (result_cache.hits + result_cache.misses)
+                            if result_cache.hits + result_cache.misses else None))
 
 LOGO_PATH = os.path.abspath(os.path.join(APP_DIR, '..', 'WebAnalayzer_logo.png'))
 print(f"LOGO_PATH: {LOGO_PATH}, exists: {os.path.exists(LOGO_PATH)}")
 print("="*50)
 
+if PDF_WARM_START:
+    # In the background, so a fresh worker answers /health straight away
+    threading.Thread(target=warm_start, name='pdf-warm-start', daemon=True).start()
+
 # 1. SEO ANALYSIS FUNCTION
-def seo_analysis(url):
+@timed('seo')
+def seo_analysis(url, page=None, collect_resources=False):
     try:
-        if not url.startswith(('http://', 'https://')):
-            url = 'https://' + url
+        url = normalize_scheme(url)
         
         print(f"Analyzing SEO for: {url}")
-        response = requests.get(url, timeout=10)
-        soup = BeautifulSoup(response.text, "html.parser")
-
-        title = soup.title.string if soup.title else "Missing"
-
-        meta_desc = soup.find("meta", attrs={"name": "description"})
-        meta_status = "Present" if meta_desc else "Missing"
-
-        h1_tags = soup.find_all("h1")
-        h1_count = len(h1_tags)
-
-        images = soup.find_all("img")
-        images_without_alt = 0
-        for img in images:
-            if not img.get("alt"):
-                images_without_alt += 1
+        if page is None:
+            page = fetch_page(url)
+        # Single streaming pass over the body; no document tree is built
+        signals = extract_seo(iter_decoded(page['content'], page['encoding']), collect_resources=collect_resources)
 
         print(f"SEO analysis complete for {url}")
         return {
             "url": url,
-            "title": title,
-            "meta_description": meta_status,
-            "h1_count": h1_count,
-            "images_without_alt": images_without_alt,
-            "total_images": len(images)
+            "title": signals['title'],
+            "meta_description": signals['meta_description'],
+            "h1_count": signals['h1_count'],
+            "images_without_alt": signals['images_without_alt'],
+            "total_images": signals['total_images'],
+            **({"resources": signals['resources'], "base_href": signals['base_href']} if collect_resources else {})
         }
     except Exception as e:
         print(f"SEO Analysis Error: {str(e)}")
         raise Exception(f"SEO Analysis failed: {str(e)}")
 
 # 2. PERFORMANCE ANALYSIS
-def performance_analysis(url):
+@timed('performance')
+def performance_analysis(url, page=None, resources=None, base_href=None, samples=None):
+    """Score the document's load timings over ``samples`` requests (default
+    LATENCY_SAMPLES); given the page's ``resources`` (deep mode) also measure
+    total page weight and blend it into the score"""
     try:
-        if not url.startswith(('http://', 'https://')):
-            url = 'https://' + url
+        url = normalize_scheme(url)
             
         print(f"Analyzing Performance for: {url}")
-        start_time = time.time()
-        response = requests.get(url, timeout=10)
-        response_time = (time.time() - start_time) * 1000
-        
-        # Response time score (lower is better)
-        score = max(10, min(100, int(100 - (response_time / 10))))
-        
-        print(f"Performance analysis complete for {url} (Response time: {response_time:.2f}ms, Score: {score})")
-        return {
+        if page is None:
+            page = fetch_page(url)
+        timings = page['timings']
+        latency = sample_latency(url, page, samples)
+        response_time = latency['total']['p50']
+        
+        score = compute_performance_score(timings, latency)
+        weight = None
+        if resources is not None:
+            weight = analyze_page_weight(page, resources, base_href)
+            weight['score'] = page_weight_score(weight)
+            weight['timing_score'] = score
+            score = blend_page_weight(score, weight['score'])
+            print(f"Page weight for {url}: {weight['total_bytes']} bytes in {weight['requests']} requests")
+        
+        print(f"Performance analysis complete for {url} (Response time p50: {response_time:.2f}ms over {latency['samples']} samples, "
+              f"TTFB p50: {latency['ttfb']['p50']:.2f}ms, Score: {score})")
+        result = {
             "score": score,
             "response_time": response_time,
-            "status_code": response.status_code
+            "status_code": page['status_code'],
+            "timings": {
+                "dns": timings['dns'],
+                "connect": timings['connect'],
+                "tls": timings['tls'],
+                "ttfb": timings['ttfb'],
+                "download": timings['download'],
+                "total": timings['total']
+            },
+            "latency": latency
         }
+        if weight is not None:
+            result["page_weight"] = weight
+        return result
     except Exception as e:
         print(f"Performance Analysis Error: {str(e)}")
-        return {
-            "score": 50,
-            "response_time": 0,
-            "status_code": 0
-        }
+        raise Exception(f"Performance Analysis failed: {str(e)}")
+
+# Fetch the page once and run both analyzers on the same response.
+# Recent results come from the cache; stale ones are revalidated with a
+# conditional GET so unchanged pages cost a 304 instead of a re-analysis;
+# the SEO result is reused, but performance is rescored from the 304's own
+# timings. Only freshly measured results are written to the history store. Concurrent calls for
+# the same URL share one fetch and analysis. A cached result is only reused
+# if it was measured over at least as many latency samples as requested.
+@timed('analyze')
+def analyze_url(url, deep=False, samples=None):
+    url = normalize_scheme(url)
+    cache_key = normalize_url(url)
+    if deep:
+        # Deep results carry page-weight data, so they are cached separately
+        cache_key = 'deep:' + cache_key
+    samples = sample_count(samples)
+    result, shared = analysis_flight.do((cache_key, samples), _analyze_url, url, cache_key, deep, samples)
+    if shared:
+        print(f"Shared in-flight analysis: {cache_key}")
+    return result
+
+
+def _analyze_url(url, cache_key, deep, samples):
+    entry, fresh = result_cache.get(cache_key) if result_cache else (None, False)
+    if entry and entry.get('samples', 1) < samples:
+        # Cached for fewer samples than asked for; measure again (and cache that).
+        # Compared with the requested count, as some samples may have failed
+        entry, fresh = None, False
+    if fresh:
+        print(f"Cache hit: {cache_key}")
+        return entry['seo'], entry['performance']
+
+    headers = result_cache.conditional_headers(entry) if entry else None
+    print(f"Fetching page: {url}")
+    try:
+        page = fetch_page(url, headers=headers)
+    except Exception as e:
+        print(f"Fetch Error: {str(e)}")
+        raise Exception(f"SEO Analysis failed: {str(e)}")
+
+    if entry and page['status_code'] == 304:
+        print(f"Not modified, reusing cached SEO analysis: {cache_key}")
+        performance_result = _revalidated_performance(url, page, entry['performance'], samples)
+        result_cache.refresh(cache_key, entry, performance_result)
+        if history:
+            history.record(entry['seo'], performance_result)
+        return entry['seo'], performance_result
+    print(f"Fetched {len(page['content'])} bytes in {page['timings']['total']:.2f}ms")
+
+    seo_result = seo_analysis(url, page, collect_resources=deep)
+    resources = seo_result.pop('resources', None)
+    base_href = seo_result.pop('base_href', None)
+    performance_result = performance_analysis(url, page, resources, base_href, samples)
+    if result_cache and 200 <= page['status_code'] < 300:
+        result_cache.set(cache_key, seo_result, performance_result, page['headers'], samples)
+    if history:
+        history.record(seo_result, performance_result)
+    return seo_result, performance_result
+
+def _revalidated_performance(url, page, cached, samples):
+    # The 304 just measured the server afresh, so timings and score come from
+    # it; the status and page weight (which needs the unchanged body) carry over
+    performance_result = performance_analysis(url, page, samples=samples)
+    performance_result['status_code'] = cached['status_code']
+    weight = cached.get('page_weight')
+    if weight:
+        weight = dict(weight, timing_score=performance_result['score'])
+        performance_result['score'] = blend_page_weight(performance_result['score'], weight['score'])
+        performance_result['page_weight'] = weight
+    return performance_result
 
 # 3. REPORT GENERATION (Text)
+@timed('report')
 def generate_report(seo, performance):
+    timings = performance.get('timings') or {}
     report = f"""
 AI WEBSITE ANALYSIS REPORT
 Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
@@ -152,8 +278,10 @@ SEO ANALYSIS:
 PERFORMANCE ANALYSIS:
 - Website Performance Score: {performance['score']}/100
 - Response Time: {performance['response_time']:.2f}ms
+- Time to First Byte: {timings.get('ttfb', 0):.2f}ms (DNS {timings.get('dns', 0):.0f}ms, Connect {timings.get('connect', 0):.0f}ms, TLS {timings.get('tls', 0):.0f}ms)
+- Download Time: {timings.get('download', 0):.2f}ms
 - Status Code: {performance['status_code']}
-
+{_latency_lines(performance.get('latency'))}{_page_weight_lines(performance.get('page_weight'))}
 RECOMMENDATIONS:
 - Add meta description if missing
 - Use only one H1 tag per page
@@ -163,16 +291,33 @@ RECOMMENDATIONS:
 """
     return report
 
+def _latency_lines(latency):
+    if not latency:
+        return ""
+    total = latency['total']
+    return (f"- Latency over {latency['samples']} requests: p50 {total['p50']:.0f}ms, p90 {total['p90']:.0f}ms, "
+            f"p99 {total['p99']:.0f}ms, jitter {latency['jitter']:.0f}ms\n"
+            f"- TTFB distribution: p50 {latency['ttfb']['p50']:.0f}ms, p90 {latency['ttfb']['p90']:.0f}ms "
+            f"({latency['cold_samples']} cold, {latency['warm_samples']} warm)\n")
+
+def _page_weight_lines(weight):
+    if not weight:
+        return ""
+    return (f"- Page Weight: {weight['total_bytes'] / 1024:.0f} KB in {weight['requests']} requests"
+            f"{' (partial)' if weight['truncated'] else ''}\n"
+            f"- Critical Path: {weight['critical_path_bytes'] / 1024:.0f} KB, {weight['blocking_resources']} render-blocking resources\n"
+            f"- Compression: {weight['compressed']}/{weight['compressible']} text responses compressed\n"
+            f"- Caching: {weight['cacheable']}/{weight['resources_measured']} subresources cacheable\n")
+
 # 4. EMAIL SENDING FUNCTION WITH PDF ATTACHMENT
-def send_email(user_email, report, pdf_path):
+@timed('email')
+def send_email(user_email, report, pdf_path, wait=True):
+    """Queue a report email; with wait=False return as soon as it is queued"""
     try:
-        sender_email = "harshavardhankatta5@gmail.com"
-        app_password = "jfvr czuu iwrr acyf"
-
         msg = EmailMessage()
         msg.set_content(report)
         msg["Subject"] = "AI Website Growth Analysis Report"
-        msg["From"] = sender_email
+        msg["From"] = SMTP_FROM
         msg["To"] = user_email
 
         # Attach PDF
@@ -182,464 +327,132 @@ def send_email(user_email, report, pdf_path):
             print(f"PDF attached to email")
 
         print(f"Sending email to: {user_email}")
-        # Set socket timeout to prevent hanging
-        socket.setdefaulttimeout(10)
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465, timeout=10) as server:
-            server.login(sender_email, app_password)
-            server.send_message(msg)
-        
+        future = mailer.send(msg)
+        if not wait:
+            future.add_done_callback(lambda f: _log_email_result(user_email, f))
+            return True
+        future.result(timeout=SMTP_TIMEOUT * (SMTP_RETRIES + 2))
         print(f"Email sent successfully to: {user_email}")
         return True
     except smtplib.SMTPAuthenticationError as e:
+        stage_errors.inc(stage='email')
         print(f"Email Auth Error: {str(e)}")
         print("Note: Email not sent due to authentication error, but PDF was generated")
         return False
-    except socket.timeout as e:
+    except (FutureTimeout, socket.timeout) as e:
+        stage_errors.inc(stage='email')
         print(f"Email Timeout Error: {str(e)}")
         print("Note: Email sending timed out, but PDF was generated")
         return False
     except Exception as e:
+        stage_errors.inc(stage='email')
         print(f"Email Sending Error: {str(e)}")
         print("Note: Email failed but PDF analysis was completed")
         return False
 
-# 5. PDF GENERATION WITH CHARTS
-# 5. GENERATE SMART RECOMMENDATIONS BASED ON ANALYSIS
-def generate_recommendations(seo, performance):
-    recommendations = []
-    
-    # SEO Recommendations
-    if seo['meta_description'] == 'Missing':
-        recommendations.append("✓ Add meta description to home page (recommended 150-160 characters)")
+
+def _log_email_result(user_email, future):
+    error = future.exception()
+    if error is None:
+        print(f"Email sent successfully to: {user_email}")
     else:
-        recommendations.append("✓ Meta description present - ensure it's compelling and keyword-rich")
-    
-    if seo['h1_count'] > 1:
-        recommendations.append("✓ Use only ONE H1 tag per page for better SEO hierarchy")
-    elif seo['h1_count'] == 0:
-        recommendations.append("✓ Add an H1 tag to your main pages for better SEO")
-    
-    if seo['images_without_alt'] > 0:
-        recommendations.append(f"✓ Add ALT text to {seo['images_without_alt']} images for accessibility and SEO")
-    
-    if seo['title'] == 'Missing':
-        recommendations.append("✓ Add a descriptive title tag (optimal: 50-60 characters)")
-    
-    # Performance Recommendations
-    if performance['score'] < 60:
-        recommendations.append("✓ Website performance is slow - consider image optimization and caching")
-    elif performance['score'] < 80:
-        recommendations.append("✓ Optimize assets to improve page load speed")
-    
-    if performance['response_time'] > 3000:
-        recommendations.append("✓ Response time exceeds 3 seconds - implement CDN for faster delivery")
-    elif performance['response_time'] > 2000:
-        recommendations.append("✓ Reduce server response time through database optimization and caching")
-    
-    # Content Recommendations
-    recommendations.append("✓ Create descriptive, unique titles for each page (50-60 chars)")
-    recommendations.append("✓ Write engaging meta descriptions with target keywords (150-160 chars)")
-    recommendations.append("✓ Use internal linking to improve crawlability and user navigation")
-    recommendations.append("✓ Optimize images (compress, use modern formats like WebP)")
-    recommendations.append("✓ Implement lazy loading for images below the fold")
-    
-    # Technical Recommendations
-    recommendations.append("✓ Enable GZIP compression to reduce file transfer sizes")
-    recommendations.append("✓ Minify CSS and JavaScript files to reduce load times")
-    recommendations.append("✓ Use browser caching to improve repeat visitor load times")
-    recommendations.append("✓ Implement structured data (Schema.org) for better rich snippets")
-    recommendations.append("✓ Ensure mobile responsiveness across all devices")
-    recommendations.append("✓ Implement SSL/HTTPS for secure data transmission")
-    
-    # UX Recommendations
-    recommendations.append("✓ Ensure clear navigation hierarchy on all pages")
-    recommendations.append("✓ Use readable fonts (minimum 16px for body text)")
-    recommendations.append("✓ Implement a clear call-to-action (CTA) strategy")
-    recommendations.append("✓ Design mobile-first experience for growing mobile traffic")
-    recommendations.append("✓ Reduce bounce rate with engaging above-the-fold content")
-    
-    return recommendations
-
-def generate_pdf_report(seo, performance, user_email):
+        stage_errors.inc(stage='email')
+        print(f"Email Sending Error: {str(error)}")
+
+# 5. PDF GENERATION (rendered in the process pool, see pdf_report.py)
+@timed('pdf')
+def generate_pdf_report(seo, performance, user_email, job_id=None):
     try:
-        print("Generating PDF report...")
-        
-        # Sanitize email for filename
-        sanitized_email = ''.join([c if c.isalnum() else '_' for c in user_email])
-        # Create temporary file (include email to help lookup)
-        pdf_path = os.path.join(REPORTS_DIR, f"report_{sanitized_email}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf")
-        
-        # Create PDF with better margins
-        doc = SimpleDocTemplate(pdf_path, pagesize=letter,
-                               rightMargin=0.6*inch,
-                               leftMargin=0.6*inch,
-                               topMargin=0.6*inch,
-                               bottomMargin=0.6*inch)
-        
-        elements = []
-        styles = getSampleStyleSheet()
-        
-        # Custom styles - more professional
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=20,
-            textColor=colors.HexColor('#ffffff'),
-            spaceAfter=6,
-            spaceBefore=6,
-            alignment=TA_CENTER
-        )
-        
-        subtitle_style = ParagraphStyle(
-            'Subtitle',
-            parent=styles['Normal'],
-            fontSize=11,
-            textColor=colors.HexColor('#404040'),
-            spaceAfter=2,
-            spaceBefore=2,
-            alignment=TA_CENTER
-        )
-        
-        section_heading_style = ParagraphStyle(
-            'SectionHeading',
-            parent=styles['Heading2'],
-            fontSize=12,
-            textColor=colors.HexColor('#ffffff'),
-            spaceAfter=8,
-            spaceBefore=8,
-            leftIndent=6
-        )
-        
-        # Header with Logo and Title
-        header_table_data = []
-        if os.path.exists(LOGO_PATH):
-            try:
-                img = Image(LOGO_PATH, width=1*inch, height=1*inch)
-                header_table_data.append([img, Paragraph("AI Website Analysis Report", title_style)])
-            except:
-                header_table_data.append([Paragraph("AI Website Analysis Report", title_style)])
-        else:
-            header_table_data.append([Paragraph("AI Website Analysis Report", title_style)])
-        
-        header_table = Table(header_table_data, colWidths=[1.2*inch, 5.3*inch])
-        header_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#1a73e8')),
-            ('ALIGN', (0, 0), (0, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ]))
-        
-        elements.append(header_table)
-        elements.append(Spacer(1, 0.15*inch))
-        
-        # Website Info Section
-        info_data = [
-            ['Website URL:', seo['url']],
-            ['Analysis Date:', datetime.now().strftime('%Y-%m-%d %H:%M:%S')],
-            ['Recipient:', user_email]
-        ]
-        
-        info_table = Table(info_data, colWidths=[1.5*inch, 4.84*inch])
-        info_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f5f5f5')),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-            ('LEFTPADDING', (0, 0), (-1, -1), 6),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 6),
-            ('TOPPADDING', (0, 0), (-1, -1), 4),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cccccc')),
-        ]))
-        
-        elements.append(info_table)
-        elements.append(Spacer(1, 0.15*inch))
-        
-        # SEO Analysis Section Header
-        seo_header = Table([['SEO ANALYSIS']], colWidths=[6.34*inch])
-        seo_header.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#1a73e8')),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.whitesmoke),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 12),
-            ('ALIGNMENT', (0, 0), (-1, -1), 'CENTER'),
-            ('TOPPADDING', (0, 0), (-1, -1), 6),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ]))
-        elements.append(seo_header)
-        
-        # SEO Metrics Table - Compact
-        seo_data = [
-            ['Metric', 'Status', 'Recommendation'],
-            ['Title Tag', seo['title'][:30], 'Use descriptive, unique titles'],
-            ['Meta Description', seo['meta_description'], 'Add compelling description (160 chars)'],
-            ['H1 Tags', str(seo['h1_count']), 'Use only 1 H1 per page'],
-            ['Total Images', str(seo['total_images']), 'Optimize image sizes'],
-            ['Images without ALT', str(seo['images_without_alt']), 'Add ALT text to all images'],
-        ]
-        
-        seo_table = Table(seo_data, colWidths=[1.5*inch, 1.5*inch, 3.34*inch])
-        seo_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#34a853')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('FONTSIZE', (0, 1), (-1, -1), 9),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('LEFTPADDING', (0, 0), (-1, -1), 4),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 4),
-            ('TOPPADDING', (0, 0), (-1, -1), 4),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#000000')),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.HexColor('#ffffff'), colors.HexColor('#f0f7f0')])
-        ]))
-        
-        elements.append(seo_table)
-        elements.append(Spacer(1, 0.1*inch))
-        
-        # SEO Chart
-        seo_chart_path = create_seo_chart(seo)
-        if seo_chart_path:
-            img = Image(seo_chart_path, width=6.34*inch, height=2.5*inch)
-            elements.append(img)
-        
-        elements.append(Spacer(1, 0.15*inch))
-        
-        # Performance Analysis Section Header
-        perf_header = Table([['PERFORMANCE ANALYSIS']], colWidths=[6.34*inch])
-        perf_header.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#ea4335')),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.whitesmoke),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 12),
-            ('ALIGNMENT', (0, 0), (-1, -1), 'CENTER'),
-            ('TOPPADDING', (0, 0), (-1, -1), 6),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ]))
-        elements.append(perf_header)
-        
-        # Performance Metrics Table - Compact
-        perf_data = [
-            ['Metric', 'Value', 'Status'],
-            ['Performance Score', f"{performance['score']}/100", 'Good' if performance['score'] >= 80 else 'Fair' if performance['score'] >= 60 else 'Needs Work'],
-            ['Response Time', f"{performance['response_time']:.0f}ms", 'Fast' if performance['response_time'] < 1000 else 'Slow'],
-            ['HTTP Status', str(performance['status_code']), 'OK' if performance['status_code'] == 200 else 'Check']
-        ]
-        
-        perf_table = Table(perf_data, colWidths=[2*inch, 1.5*inch, 2.84*inch])
-        perf_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#fbbc04')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#000000')),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('FONTSIZE', (0, 1), (-1, -1), 9),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('LEFTPADDING', (0, 0), (-1, -1), 4),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 4),
-            ('TOPPADDING', (0, 0), (-1, -1), 4),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#000000')),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.HexColor('#ffffff'), colors.HexColor('#fffef0')])
-        ]))
-        
-        elements.append(perf_table)
-        elements.append(Spacer(1, 0.1*inch))
-        
-        # Performance Chart
-        perf_chart_path = create_performance_chart(performance)
-        if perf_chart_path:
-            img = Image(perf_chart_path, width=6.34*inch, height=3*inch)
-            elements.append(img)
-        
-        elements.append(PageBreak())
-        
-        # Recommendations Section
-        rec_header = Table([['COMPREHENSIVE RECOMMENDATIONS']], colWidths=[6.34*inch])
-        rec_header.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#5f6368')),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.whitesmoke),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 12),
-            ('ALIGNMENT', (0, 0), (-1, -1), 'CENTER'),
-            ('TOPPADDING', (0, 0), (-1, -1), 6),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ]))
-        elements.append(rec_header)
-        elements.append(Spacer(1, 0.08*inch))
-        
-        # Generate recommendations based on analysis
-        recommendations = generate_recommendations(seo, performance)
-        
-        # Split recommendations into categories
-        categories = {
-            'SEO & Content': [],
-            'User Experience': [],
-            'Performance': [],
-            'Technical': []
-        }
-        
-        for rec in recommendations:
-            if any(keyword in rec for keyword in ['SEO', 'keyword', 'title', 'meta', 'description', 'H1', 'heading', 'content', 'link']):
-                categories['SEO & Content'].append(rec)
-            elif any(keyword in rec for keyword in ['UX', 'user', 'mobile', 'responsive', 'navigation', 'accessibility']):
-                categories['User Experience'].append(rec)
-            elif any(keyword in rec for keyword in ['performance', 'speed', 'load', 'optimize', 'compress', 'cache', 'CDN']):
-                categories['Performance'].append(rec)
-            else:
-                categories['Technical'].append(rec)
-        
-        # Recommendations table
-        rec_rows = [['Category', 'Recommendation']]
-        for category, recs in categories.items():
-            for i, rec in enumerate(recs):
-                if i == 0:
-                    rec_rows.append([category, rec])
-                else:
-                    rec_rows.append(['', rec])
-        
-        rec_table = Table(rec_rows, colWidths=[1.5*inch, 4.84*inch])
-        rec_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#5f6368')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 9),
-            ('FONTSIZE', (0, 1), (-1, -1), 8),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (-1, -1), 'LEFT'),
-            ('LEFTPADDING', (0, 0), (-1, -1), 5),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 5),
-            ('TOPPADDING', (0, 0), (-1, -1), 5),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cccccc')),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.HexColor('#ffffff'), colors.HexColor('#f9f9f9')])
-        ]))
-        
-        elements.append(rec_table)
-        
-        # Footer
-        elements.append(Spacer(1, 0.2*inch))
-        footer_text = Paragraph(
-            "<i>This report was generated by WebAnalyzer AI. Follow these recommendations to improve your website's performance and SEO.</i>",
-            ParagraphStyle(
-                'Footer',
-                parent=styles['Normal'],
-                fontSize=8,
-                textColor=colors.HexColor('#666666'),
-                alignment=TA_CENTER
-            )
-        )
-        elements.append(footer_text)
-        
-        # Build PDF
-        doc.build(elements)
-        print(f"PDF report generated: {pdf_path}")
+        trend = history.series(seo['url'], days=HISTORY_REPORT_DAYS) if history else None
+        pdf_path = render_pdf(seo, performance, user_email, REPORTS_DIR, job_id, trend)
+        report_index.add(user_email, os.path.basename(pdf_path), job_id=job_id, url=seo['url'])
         return pdf_path
-        
     except Exception as e:
         print(f"PDF Generation Error: {str(e)}")
         raise Exception(f"PDF generation failed: {str(e)}")
 
 
-def generate_and_send_pdf(seo, performance, user_email, text_report):
+@timed('pdf')
+def render_report(seo, performance, user_email, persist=False):
+    """PDF bytes rendered in memory; with persist, also saved and indexed like emailed reports"""
     try:
-        pdf_path = generate_pdf_report(seo, performance, user_email)
-        send_email(user_email, text_report, pdf_path)
+        trend = history.series(seo['url'], days=HISTORY_REPORT_DAYS) if history else None
+        pdf_bytes = render_pdf(seo, performance, user_email, None, None, trend)
+        if persist:
+            filename = report_filename(user_email)
+            with open(os.path.join(REPORTS_DIR, filename), 'wb') as f:
+                f.write(pdf_bytes)
+            report_index.add(user_email, filename, url=seo['url'])
+        return pdf_bytes
     except Exception as e:
-        print(f"Background PDF generation/send failed: {str(e)}")
+        print(f"PDF Generation Error: {str(e)}")
+        raise Exception(f"PDF generation failed: {str(e)}")
 
-# 6. CHART GENERATION FUNCTIONS
-def create_seo_chart(seo):
-    try:
-        print("Creating SEO chart...")
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(10, 4))
-        fig.patch.set_facecolor('white')
-        
-        # Bar chart for images
-        categories = ['Total Images', 'With ALT', 'Without ALT']
-        values = [seo['total_images'], seo['total_images'] - seo['images_without_alt'], seo['images_without_alt']]
-        colors_list = ['#1a73e8', '#34a853', '#ea4335']
-        
-        ax1.bar(categories, values, color=colors_list)
-        ax1.set_ylabel('Count')
-        ax1.set_title('Image ALT Tag Analysis')
-        ax1.grid(axis='y', alpha=0.3)
-        
-        # Pie chart for meta tags
-        meta_status = [1 if seo['meta_description'] == 'Present' else 0, 1 if seo['meta_description'] == 'Missing' else 0]
-        meta_labels = [seo['meta_description'], 'Not ' + seo['meta_description']]
-        meta_colors = ['#34a853', '#ea4335']
-        
-        if meta_status[0] > 0:
-            ax2.pie([1], labels=['Meta Description Present'], colors=['#34a853'], autopct='%1.0f%%', startangle=90)
-        else:
-            ax2.pie([1], labels=['Meta Description Missing'], colors=['#ea4335'], autopct='%1.0f%%', startangle=90)
-        
-        ax2.set_title('Meta Description Status')
-        
-        plt.tight_layout()
-        
-        chart_path = os.path.join(REPORTS_DIR, 'seo_chart.png')
-        plt.savefig(chart_path, dpi=100, bbox_inches='tight', facecolor='white')
-        plt.close()
-        
-        return chart_path
-    except Exception as e:
-        print(f"SEO Chart Error: {str(e)}")
-        return None
 
-def create_performance_chart(performance):
+def generate_and_send_pdf(seo, performance, user_email, text_report, job_id=None):
     try:
-        print("Creating performance chart...")
-        fig, ax = plt.subplots(figsize=(8, 6))
-        fig.patch.set_facecolor('white')
-        
-        score = performance['score']
-        colors_list = []
-        
-        if score >= 80:
-            colors_list = ['#34a853', '#e8e8e8']
-        elif score >= 60:
-            colors_list = ['#fbbc04', '#e8e8e8']
-        else:
-            colors_list = ['#ea4335', '#e8e8e8']
-        
-        # Create pie chart for performance score
-        sizes = [score, 100 - score]
-        labels = [f'Score: {score}/100', f'Remaining: {100-score}']
-        explode = (0.05, 0)
-        
-        wedges, texts, autotexts = ax.pie(sizes, explode=explode, labels=labels, autopct='%1.1f%%',
-                                           colors=colors_list, shadow=True, startangle=90)
-        
-        ax.set_title(f'Website Performance Score\nResponse Time: {performance["response_time"]:.2f}ms', fontsize=14, fontweight='bold')
-        
-        for autotext in autotexts:
-            autotext.set_color('white')
-            autotext.set_fontweight('bold')
-            autotext.set_fontsize(12)
-        
-        plt.tight_layout()
-        
-        chart_path = os.path.join(REPORTS_DIR, 'performance_chart.png')
-        plt.savefig(chart_path, dpi=100, bbox_inches='tight', facecolor='white')
-        plt.close()
-        
-        return chart_path
+        pdf_path = generate_pdf_report(seo, performance, user_email, job_id)
+        send_email(user_email, text_report, pdf_path)
+        return pdf_path
     except Exception as e:
-        print(f"Performance Chart Error: {str(e)}")
+        print(f"Background PDF generation/send failed: {str(e)}")
         return None
 
+
+def run_analysis_job(job, url, email, deep=False, samples=None, dedup_key=None):
+    """Full /analyze pipeline, run on a job queue worker"""
+    result = _analysis_job(job, url, email, deep, samples)
+    if dedup_key:
+        # Identical submissions start a new job from here on (the key comes
+        # back as a list from a durable queue). A failed job isn't released
+        # here: a durable queue may retry it, and duplicates should keep
+        # sharing it until then. Once it has failed for good the in-flight
+        # map sees it is no longer active
+        admission.in_flight.release(tuple(dedup_key), job.id)
+    return result
+
+
+def _analysis_job(job, url, email, deep, samples):
+    job.set_stage('analyzing')
+    seo_result, performance_score = analyze_url(url, deep, samples)
+    # Expose results to pollers while the PDF is still being built
+    job.result = {"seo": seo_result, "performance": performance_score, "pdf_ready": False}
+
+    job.set_stage('sending_summary')
+    text_report = generate_report(seo_result, performance_score)
+    # Queue a quick text-only email first so the user receives something fast;
+    # the PDF email is queued behind it for the mailer's pooled sender threads
+    send_email(email, text_report, None, wait=False)
+
+    job.set_stage('generating_pdf')
+    pdf_path = generate_and_send_pdf(seo_result, performance_score, email, text_report, job.id)
+
+    job.set_stage('complete')
+    return {"seo": seo_result, "performance": performance_score, "pdf_ready": pdf_path is not None}
+
+
+def send_batch_report(job, email, report):
+    """Combined /analyze/batch report email, run on a job queue worker"""
+    return send_email(email, report, None)
+
 # HEALTH CHECK
 @app.route("/health", methods=["GET"])
 def health():
     """Health check endpoint for Railway"""
     return jsonify({"status": "ok", "message": "WebAnalyzer backend is running"})
 
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Prometheus scrape endpoint"""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+def _sample_count(data):
+    """Optional "samples" field of an analyze request (capped by LATENCY_MAX_SAMPLES)"""
+    try:
+        return int(data["samples"]) if data.get("samples") is not None else None
+    except (TypeError, ValueError):
+        return None
+
 @app.route("/test-analyze", methods=["POST"])
 def test_analyze():
     """Test endpoint that doesn't require email"""
@@ -654,11 +467,9 @@ def test_analyze():
 
         print(f"Test URL: {url}")
         
-        print("Starting SEO analysis...")
-        seo_result = seo_analysis(url)
-        
-        print("Starting performance analysis...")
-        performance_score = performance_analysis(url)
+        print("Starting analysis...")
+        seo_result, performance_score = analyze_url(url, bool(data.get("deep", PERFORMANCE_MODE == 'deep')),
+                                                     _sample_count(data))
         
         print("=== Test request completed successfully ===")
         return jsonify({
@@ -685,31 +496,236 @@ def analyze():
 
         print(f"URL: {url}, Email: {email}")
         
-        print("Starting SEO analysis...")
-        seo_result = seo_analysis(url)
-        
-        print("Starting performance analysis...")
-        performance_score = performance_analysis(url)
-        
-        print("Generating text report...")
-        text_report = generate_report(seo_result, performance_score)
-        
-        print("Queueing quick text email (no attachment) to send immediately in background...")
-        # Send a quick text-only email immediately so user receives something fast
-        executor.submit(send_email, email, text_report, None)
+        deep = bool(data.get("deep", PERFORMANCE_MODE == 'deep'))
+        samples = _sample_count(data)
+        # The same report for the same recipient, already queued or running, is answered with that job
+        dedup_key = (normalize_url(url), normalize_recipient(email), deep, samples)
+        job_id = admission.in_flight.get(dedup_key)
+        created = False
+        if job_id is None:
+            refused = admission.check(client_ip(request), normalize_recipient(email))
+            if refused:
+                reason, wait = refused
+                print(f"Rate limited ({reason}), retry in {wait}s")
+                return jsonify({"error": f"Too many requests, please try again in {wait} seconds", "retry_after": wait}), \
+                    429, {"Retry-After": str(wait)}
+            try:
+                job_id, created = admission.in_flight.submit(
+                    dedup_key, lambda: job_queue.submit('analyze', run_analysis_job, url, email, deep, samples,
+                                                        dedup_key=dedup_key))
+            except QueueFull:
+                wait = retry_after(job_queue.wait_estimate())
+                admission_rejected.inc(reason='queue')
+                print(f"Job queue full, rejecting request (retry in {wait}s)")
+                return jsonify({"error": f"Server is busy, please try again in {wait} seconds", "retry_after": wait}), \
+                    429, {"Retry-After": str(wait)}
+        if not created:
+            admission_deduplicated.inc()
+
+        print(f"=== Request accepted as job {job_id}{'' if created else ' (already in flight)'} ===")
+        return jsonify({
+            "message": "Analysis started. A quick summary email will arrive shortly; full PDF will follow when ready.",
+            "job_id": job_id,
+            "status_url": f"/jobs/{job_id}",
+            "deduplicated": not created,
+        }), 202
+    except Exception as e:
+        error_msg = str(e)
+        print(f"ERROR: {error_msg}")
+        return jsonify({"error": error_msg}), 500
+
 
-        print("Queueing PDF generation and attachment send in background...")
-        # Generate PDF and send as a follow-up email in background
-        executor.submit(generate_and_send_pdf, seo_result, performance_score, email, text_report)
+@app.route("/report", methods=["GET"])
+def stream_report():
+    """Analyze a URL and return its PDF report in the response.
 
-        print("=== Request accepted and background tasks queued ===")
-        return jsonify({"message": "Analysis started. A quick summary email will arrive shortly; full PDF will follow when ready."})
+    The report is rendered in memory and streamed in chunks; nothing touches
+    REPORTS_DIR unless persist=1 is given, which also keeps it for
+    /download-latest. Query parameters: url (required), email (shown as the
+    recipient, required to persist), deep, samples and persist. The request
+    takes as long as the analysis, so /analyze remains the better fit for
+    slow sites.
+    """
+    try:
+        url = request.args.get("url")
+        if not url:
+            return jsonify({"error": "url query parameter is required"}), 400
+        email = request.args.get("email")
+        persist = request.args.get("persist", "").lower() in ("1", "true", "yes", "on")
+        if persist and not email:
+            return jsonify({"error": "email is required to persist the report"}), 400
+
+        refused = admission.check(client_ip(request), normalize_recipient(email) if email else None)
+        if refused:
+            reason, wait = refused
+            print(f"Rate limited ({reason}), retry in {wait}s")
+            return jsonify({"error": f"Too many requests, please try again in {wait} seconds", "retry_after": wait}), \
+                429, {"Retry-After": str(wait)}
+
+        deep = str(request.args.get("deep", PERFORMANCE_MODE == 'deep')).lower() in ("1", "true", "yes", "on")
+        seo_result, performance_score = analyze_url(url, deep, _sample_count(request.args))
+        pdf_bytes = render_report(seo_result, performance_score, email or "Not specified", persist)
     except Exception as e:
         error_msg = str(e)
-        print(f"ERROR: {error_msg}")
+        print(f"REPORT ERROR: {error_msg}")
+        return jsonify({"error": error_msg}), 500
+
+    def generate():
+        view = memoryview(pdf_bytes)
+        for start in range(0, len(view), REPORT_CHUNK_SIZE):
+            yield view[start:start + REPORT_CHUNK_SIZE].tobytes()
+
+    return Response(generate(), mimetype='application/pdf',
+                    headers={"Content-Disposition": 'attachment; filename="analysis_report.pdf"'})
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    """Status and results of a queued analysis"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job ID"}), 404
+    return jsonify(job)
+
+
+@app.route("/analyze/batch", methods=["POST"])
+def analyze_batch():
+    """Analyze many URLs concurrently, streaming one NDJSON line per site.
+
+    Accepts JSON {"urls": [...], "summary": true, "email": "..."} or a
+    multipart upload with a CSV/JSONL "file" plus the same options as form
+    fields. "summary" appends a combined summary line; "email" mails a
+    combined text report once the batch finishes.
+    """
+    try:
+        print("=== Batch analyze request received ===")
+        if 'file' in request.files:
+            upload = request.files['file']
+            urls = parse_urls_file(upload.filename or '', upload.read())
+            options = request.form
+        else:
+            options = request.get_json(silent=True) or {}
+            urls = options.get("urls") or []
+        urls = clean_urls(urls)
+    except BatchError as e:
+        return jsonify({"error": str(e)}), 400
+
+    want_summary = str(options.get("summary", "")).lower() in ("1", "true", "yes", "on")
+    email = options.get("email")
+    print(f"Batch of {len(urls)} URLs (summary: {want_summary}, email: {email})")
+
+    def generate():
+        results = []
+        for item in run_batch(urls, analyze_url):
+            if want_summary or email:
+                results.append(item)
+            yield json.dumps(item) + "\n"
+
+        if want_summary or email:
+            summary = summarize(results)
+            if want_summary:
+                yield json.dumps(summary) + "\n"
+            if email:
+                report = generate_batch_report(summary, results)
+                try:
+                    job_queue.submit('batch_report', send_batch_report, email, report)
+                except QueueFull:
+                    print("Job queue full, batch report email not sent")
+        if history:
+            # The batch's buffered results go to the history store in one write
+            history.flush()
+        print(f"=== Batch of {len(urls)} URLs completed ===")
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
+
+@app.route("/history", methods=["GET"])
+def site_history():
+    """Time series and aggregates for one site.
+
+    Query parameters: url (required), days (default 90, at most 3660),
+    window (rolling median width, default 7) and bucket ("day" or "run").
+    Without url, lists the recorded sites, most recently analyzed first.
+    """
+    if history is None:
+        return jsonify({"error": "History is disabled"}), 404
+    try:
+        days = min(max(float(request.args.get('days', 90)), 1), 3660)
+        window = min(max(int(request.args.get('window', 7)), 1), 365)
+        limit = min(max(int(request.args.get('limit', 100)), 1), 1000)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({"error": "days, window, limit and offset must be numbers"}), 400
+    bucket = request.args.get('bucket', 'day')
+    if bucket not in ('day', 'run'):
+        return jsonify({"error": "bucket must be \"day\" or \"run\""}), 400
+
+    url = request.args.get('url')
+    if not url:
+        return jsonify({"sites": history.sites(limit, offset)})
+    return jsonify(history.series(url, days=days, window=window, bucket=bucket))
+
+
+def run_crawl_job(job, url, max_pages, max_depth, respect_robots):
+    """Site crawl, run on a job queue worker"""
+    job.set_stage('crawling')
+
+    def progress(done, limit):
+        job.progress = {"pages": done, "max_pages": limit}
+
+    crawler = SiteCrawler(url, max_pages=max_pages, max_depth=max_depth,
+                          respect_robots=respect_robots, progress=progress)
+    summary = crawler.run()
+    job.set_stage('complete')
+    return summary
+
+
+@app.route("/crawl", methods=["POST"])
+def crawl():
+    """Crawl a site from the submitted URL; poll /jobs/<id> for the site-wide report"""
+    try:
+        print("=== Crawl request received ===")
+        data = request.get_json(silent=True) or {}
+        url = data.get("url")
+        if not url:
+            return jsonify({"error": "URL is required"}), 400
+        try:
+            max_pages = int(data.get("max_pages", CRAWL_MAX_PAGES))
+            max_depth = int(data.get("max_depth", CRAWL_MAX_DEPTH))
+        except (TypeError, ValueError):
+            return jsonify({"error": "max_pages and max_depth must be integers"}), 400
+        respect_robots = data.get("respect_robots", True) is not False
+
+        try:
+            job = job_queue.submit('crawl', run_crawl_job, url, max_pages, max_depth, respect_robots)
+        except QueueFull:
+            print("Job queue full, rejecting crawl")
+            return jsonify({"error": "Server is busy, please try again shortly"}), 503, {"Retry-After": "30"}
+
+        print(f"=== Crawl accepted as job {job.id} ===")
+        return jsonify({
+            "message": "Crawl started.",
+            "job_id": job.id,
+            "status_url": f"/jobs/{job.id}"
+        }), 202
+    except Exception as e:
+        error_msg = str(e)
+        print(f"CRAWL ERROR: {error_msg}")
         return jsonify({"error": error_msg}), 500
 
 
+# Jobs are looked up by kind, so a durable queue can run them in any process
+job_queue.register('analyze', run_analysis_job)
+job_queue.register('batch_report', send_batch_report)
+job_queue.register('crawl', run_crawl_job)
+
+
+@app.before_request
+def start_job_workers():
+    # Once this process serves requests; picks up jobs a previous process left queued
+    job_queue.start()
+
+
 # SERVE FRONTEND
 @app.route('/', methods=["GET"])
 def serve_index():
@@ -726,16 +742,15 @@ def serve_static(filename):
 @app.route('/download-latest')
 def download_latest():
     email = request.args.get('email')
-    if not email:
+    job_id = request.args.get('job_id')
+    if not email and not job_id:
         return jsonify({"error": "email query parameter is required"}), 400
 
-    sanitized_email = ''.join([c if c.isalnum() else '_' for c in email])
     try:
-        files = [f for f in os.listdir(REPORTS_DIR) if sanitized_email in f and f.lower().endswith('.pdf')]
-        if not files:
+        entry = report_index.by_job(job_id) if job_id else report_index.latest(email)
+        if entry is None:
             return jsonify({"error": "No report found for this email yet"}), 404
-        latest = max(files, key=lambda f: os.path.getmtime(os.path.join(REPORTS_DIR, f)))
-        return send_from_directory(REPORTS_DIR, latest, as_attachment=True)
+        return send_from_directory(REPORTS_DIR, entry['filename'], as_attachment=True)
     except Exception as e:
         print(f"Download latest error: {str(e)}")
         return jsonify({"error": "Failed to retrieve report"}), 500
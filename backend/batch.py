@@ -0,0 +1,133 @@
+import csv
+import io
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from fetcher import normalize_url
+
+# Batch configuration (overridable through the environment)
+BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', 8))
+BATCH_MAX_URLS = int(os.environ.get('BATCH_MAX_URLS', 1000))
+
+# Shared by every batch request, so BATCH_CONCURRENCY is a process-wide cap;
+# per-host politeness comes from the fetcher's host slots
+_batch_executor = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix='batch')
+
+
+class BatchError(Exception):
+    pass
+
+
+def parse_urls_file(filename, data):
+    """Read URLs from an uploaded CSV or JSONL file"""
+    text = data.decode('utf-8-sig', errors='replace')
+    urls = []
+    if filename.lower().endswith(('.jsonl', '.ndjson')):
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                raise BatchError(f"Invalid JSON line: {line[:80]}")
+            urls.append(item.get('url') if isinstance(item, dict) else item)
+    else:
+        rows = list(csv.reader(io.StringIO(text)))
+        column = 0
+        if rows and 'url' in [cell.strip().lower() for cell in rows[0]]:
+            column = [cell.strip().lower() for cell in rows[0]].index('url')
+            rows = rows[1:]
+        urls = [row[column] for row in rows if len(row) > column]
+    return urls
+
+
+def clean_urls(urls):
+    """Drop blanks and duplicates (by normalized URL), enforcing BATCH_MAX_URLS"""
+    seen = set()
+    cleaned = []
+    for url in urls:
+        if not isinstance(url, str) or not url.strip():
+            continue
+        key = normalize_url(url)
+        if key in seen:
+            continue
+        seen.add(key)
+        cleaned.append(url.strip())
+    if not cleaned:
+        raise BatchError("No URLs supplied")
+    if len(cleaned) > BATCH_MAX_URLS:
+        raise BatchError(f"Too many URLs ({len(cleaned)}); the limit is {BATCH_MAX_URLS}")
+    return cleaned
+
+
+def run_batch(urls, analyze):
+    """Analyze URLs concurrently, yielding result dicts as each one finishes.
+
+    ``analyze`` is called as analyze(url) and returns (seo, performance).
+    Pending work is cancelled if the consumer stops iterating early (for
+    example when the HTTP client disconnects).
+    """
+    pending = {_batch_executor.submit(analyze, url): url for url in urls}
+    try:
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                url = pending.pop(future)
+                try:
+                    seo, performance = future.result()
+                    yield {"type": "result", "url": url, "seo": seo, "performance": performance}
+                except Exception as e:
+                    yield {"type": "error", "url": url, "error": str(e)}
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def summarize(results):
+    """Combined figures for a finished batch, with the fleet-wide portfolio summary"""
+    # NumPy is only loaded once a batch summary is asked for
+    from fleet import portfolio_summary, score_columns, to_columns
+
+    succeeded = [r for r in results if r['type'] == 'result']
+    scores = [r['performance']['score'] for r in succeeded]
+    return {
+        "type": "summary",
+        "total": len(results),
+        "succeeded": len(succeeded),
+        "failed": len(results) - len(succeeded),
+        "average_score": round(sum(scores) / len(scores), 1) if scores else None,
+        "missing_title": sum(1 for r in succeeded if r['seo']['title'] in (None, 'Missing')),
+        "missing_meta_description": sum(1 for r in succeeded if r['seo']['meta_description'] == 'Missing'),
+        "images_without_alt": sum(r['seo']['images_without_alt'] for r in succeeded),
+        "slowest": sorted(({"url": r['url'], "response_time": r['performance']['response_time']} for r in succeeded),
+                          key=lambda item: item['response_time'], reverse=True)[:5],
+        "portfolio": portfolio_summary(score_columns(to_columns(succeeded))),
+    }
+
+
+def generate_batch_report(summary, results):
+    """Plain-text combined report for emailing"""
+    lines = [
+        "AI WEBSITE BATCH ANALYSIS REPORT",
+        "",
+        f"Sites analyzed: {summary['total']} ({summary['succeeded']} succeeded, {summary['failed']} failed)",
+        f"Average performance score: {summary['average_score']}",
+        f"Sites missing a title: {summary['missing_title']}",
+        f"Sites missing a meta description: {summary['missing_meta_description']}",
+        f"Images without ALT text: {summary['images_without_alt']}",
+        "",
+        "RESULTS:",
+    ]
+    for r in results:
+        if r['type'] == 'result':
+            lines.append(f"- {r['url']}: score {r['performance']['score']}/100, "
+                         f"{r['performance']['response_time']:.0f}ms, "
+                         f"H1 tags {r['seo']['h1_count']}, images without ALT {r['seo']['images_without_alt']}")
+        else:
+            lines.append(f"- {r['url']}: FAILED ({r['error']})")
+    if summary.get('portfolio'):
+        from fleet import portfolio_report
+        lines += ["", portfolio_report(summary['portfolio']).rstrip('\n')]
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,76 @@
+"""Compare the streaming SEO extractor with the old BeautifulSoup path.
+
+Usage:
+    python backend/benchmarks/bench_extractor.py [--corpus DIR] [--repeat N]
+
+DIR holds saved *.html pages; without it a generated corpus is used.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bs4 import BeautifulSoup
+
+from benchmarks.corpus import load_corpus
+from extractor import extract_seo, lxml_etree
+
+
+def bs4_signals(html):
+    # The pre-streaming seo_analysis implementation
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.title.string if soup.title else "Missing"
+    meta_desc = soup.find("meta", attrs={"name": "description"})
+    images = soup.find_all("img")
+    return {
+        "title": title,
+        "meta_description": "Present" if meta_desc else "Missing",
+        "h1_count": len(soup.find_all("h1")),
+        "images_without_alt": sum(1 for img in images if not img.get("alt")),
+        "total_images": len(images),
+    }
+
+
+def measure(fn, html, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(html)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best * 1000, peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--corpus', help='directory of saved HTML pages')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    engines = [
+        ('bs4', bs4_signals),
+        ('stream', lambda html: extract_seo([html], parser='html.parser')),
+    ]
+    if lxml_etree() is not None:
+        engines.append(('lxml', lambda html: extract_seo([html], parser='lxml')))
+
+    print(f"{'page':<28}{'size':>10}  " + ''.join(f"{name + ' ms':>12}{name + ' KiB':>13}" for name, _ in engines))
+    for name, html in load_corpus(args.corpus):
+        expected = bs4_signals(html)
+        row = f"{name[:27]:<28}{len(html) // 1024:>8}KB  "
+        for engine, fn in engines:
+            if engine != 'lxml' and fn(html) != expected:
+                print(f"  mismatch in {engine} for {name}: {fn(html)} != {expected}")
+            ms, kib = measure(fn, html, args.repeat)
+            row += f"{ms:>12.2f}{kib:>13.0f}"
+        print(row)
+
+
+if __name__ == '__main__':
+    main()
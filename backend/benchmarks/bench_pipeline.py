@@ -0,0 +1,257 @@
+"""Benchmark the analysis pipeline end to end, entirely offline.
+
+Starts a local fixture server (see fixture_server.py) and measures
+seo_analysis, performance_analysis, the two chart functions,
+generate_pdf_report and the /analyze job flow against it. For each case it
+reports latency percentiles, throughput and the tracemalloc high-water mark
+(for the PDF also its build time without charts and its size on disk),
+and writes everything to a JSON file tagged with the current git commit.
+
+Usage:
+    python backend/benchmarks/bench_pipeline.py [--sizes 10000,100000,1000000,10000000]
+        [--latency-ms 0] [--iterations 20] [--analyze-requests 40]
+        [--only seo,pdf] [--output results.json] [--compare previous.json] [--verbose]
+
+The backend's log output in this process is suppressed unless --verbose is
+given; PDF worker processes still write to the terminal.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BACKEND_DIR)
+
+# 10 KB .. 10 MB; the largest stays under the fetcher's default 10 MiB cap
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+CASES = ('seo', 'performance', 'seo_chart', 'performance_chart', 'pdf', 'analyze')
+
+
+def log(text, end='\n'):
+    # Progress goes to the real stdout even while the backend's prints are silenced
+    sys.__stdout__.write(text + end)
+    sys.__stdout__.flush()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(samples, wall):
+    ms = [s * 1000 for s in samples]
+    return {
+        "iterations": len(ms),
+        "mean_ms": round(sum(ms) / len(ms), 3),
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p90_ms": round(percentile(ms, 90), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "max_ms": round(max(ms), 3),
+        "throughput_per_s": round(len(ms) / wall, 2) if wall else None,
+    }
+
+
+def peak_kib(fn):
+    """tracemalloc high-water mark of one call, measured apart from the timed runs"""
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round(peak / 1024, 1)
+
+
+def run_case(fn, iterations, warmup=1):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    result = summarize(samples, time.perf_counter() - started)
+    result["peak_kib"] = peak_kib(fn)
+    return result
+
+
+def bench_analyze(app, url, requests_count):
+    """Submit /analyze jobs through the Flask test client and time each to completion"""
+    client = app.app.test_client()
+    pending = {}
+    started = time.perf_counter()
+    submitted = 0
+    while submitted < requests_count:
+        response = client.post('/analyze', json={"url": url, "email": f"bench{submitted}@example.com"})
+        if response.status_code in (429, 503):
+            # Queue full (or rate limited); let the workers drain it
+            time.sleep(float(response.headers.get('Retry-After') or 0.05))
+            continue
+        pending[response.get_json()['job_id']] = time.perf_counter()
+        submitted += 1
+    samples = []
+    failed = 0
+    while pending:
+        for job_id in list(pending):
+            job = client.get(f'/jobs/{job_id}').get_json()
+            if job['status'] in ('done', 'failed'):
+                samples.append(job['finished_at'] - job['created_at'])
+                failed += job['status'] == 'failed' or not job['result']['pdf_ready']
+                del pending[job_id]
+        time.sleep(0.02)
+    result = summarize(samples, time.perf_counter() - started)
+    result["failed"] = failed
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous, current):
+    """Print p50 changes (and PDF layout time and size, when both runs have them) against an earlier results file"""
+    old = {(r['case'], r.get('size')): r for r in previous['results']}
+    log(f"\nCompared with {previous.get('commit')} ({previous.get('timestamp')}):")
+    for r in current['results']:
+        before = old.get((r['case'], r.get('size')))
+        if before:
+            change = (r['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0
+            log(f"  {r['case']:<26}{str(r.get('size') or ''):>10}  p50 {before['p50_ms']:>10.2f} -> {r['p50_ms']:>10.2f} ms ({change:+.1f}%)")
+            for key, unit in (('layout_p50_ms', 'ms'), ('pdf_kib', 'KiB')):
+                if key in r and key in before:
+                    log(f"  {'':<36}  {key} {before[key]:>10.2f} -> {r[key]:>10.2f} {unit}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default=','.join(str(s) for s in DEFAULT_SIZES), help='page sizes in bytes')
+    parser.add_argument('--latency-ms', type=float, default=0, help='artificial server latency')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--analyze-requests', type=int, default=40)
+    parser.add_argument('--only', help=f"comma-separated subset of {','.join(CASES)}")
+    parser.add_argument('--output', help='results file (default benchmarks/results/<commit>-<time>.json)')
+    parser.add_argument('--compare', help='earlier results file to diff against')
+    parser.add_argument('--verbose', action='store_true', help="show the backend's log output")
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    cases = set(args.only.split(',')) if args.only else set(CASES)
+
+    # Keep the run self-contained: no cache hits, no real email, PDFs in a scratch dir
+    scratch = tempfile.mkdtemp(prefix='webanalyzer-bench-')
+    os.environ.setdefault('CACHE_BACKEND', 'none')
+    os.environ.setdefault('EMAIL_BACKEND', 'null')
+    os.environ['REPORTS_DIR'] = scratch
+    os.environ.setdefault('JOB_DB_PATH', os.path.join(scratch, 'jobs.sqlite3'))
+    # The analyze case submits from one client as fast as it can; 0 turns the rate limits off
+    os.environ.setdefault('ADMISSION_IP_PER_MINUTE', '0')
+    os.environ.setdefault('ADMISSION_EMAIL_PER_HOUR', '0')
+
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, 'w'))
+    with quiet:
+        report = run(args, sizes, cases, scratch)
+    output = args.output
+    if not output:
+        results_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+        os.makedirs(results_dir, exist_ok=True)
+        output = os.path.join(results_dir, f"{report['commit'] or 'nogit'}-{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    log(f"\nResults written to {output} (max RSS {report['max_rss_kib'] // 1024} MiB)")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+def run(args, sizes, cases, scratch):
+    from benchmarks.fixture_server import FixtureServer
+    import app
+    import pdf_report
+
+    server = FixtureServer(latency=args.latency_ms / 1000).start()
+    results = []
+
+    def record(case, size, fn, iterations=args.iterations):
+        log(f"{case:<26}{str(size or ''):>10} ...", end='')
+        result = {"case": case, "size": size, **run_case(fn, iterations)}
+        results.append(result)
+        log(f" p50 {result['p50_ms']:.2f} ms, p99 {result['p99_ms']:.2f} ms, peak {result['peak_kib']:.0f} KiB")
+        return result
+
+    try:
+        sample = None
+        for size in sizes:
+            url = server.page_url(size)
+            if 'seo' in cases:
+                record('seo_analysis', size, lambda: app.seo_analysis(url))
+            if 'performance' in cases:
+                record('performance_analysis', size, lambda: app.performance_analysis(url))
+            if sample is None:
+                sample = app.analyze_url(url)
+
+        if sample is None:
+            sample = app.analyze_url(server.page_url(sizes[0] if sizes else 10_000))
+        seo, performance = sample
+        if 'seo_chart' in cases:
+            record('create_seo_chart', None, lambda: pdf_report.create_seo_chart(seo))
+        if 'performance_chart' in cases:
+            record('create_performance_chart', None, lambda: pdf_report.create_performance_chart(performance))
+        if 'pdf' in cases:
+            chart_seconds = []
+
+            def build_pdf():
+                stage_times = {}
+                path = pdf_report.generate_pdf_report(seo, performance, 'bench@example.com', scratch,
+                                                      stage_times=stage_times)
+                chart_seconds.append(stage_times['chart'])
+                return path
+
+            result = record('generate_pdf_report', None, build_pdf, iterations=max(3, args.iterations // 4))
+            # Report build time without the charts, and what ends up on disk
+            result["layout_p50_ms"] = round(result['p50_ms'] - percentile(chart_seconds, 50) * 1000, 3)
+            result["pdf_kib"] = round(os.path.getsize(build_pdf()) / 1024, 1)
+            log(f"{'':<36}  layout p50 {result['layout_p50_ms']:.2f} ms, {result['pdf_kib']:.0f} KiB per report")
+
+        if 'analyze' in cases:
+            for size in sizes[:2]:
+                log(f"{'analyze_e2e':<26}{size:>10} ...", end='')
+                result = {"case": "analyze_e2e", "size": size,
+                          **bench_analyze(app, server.page_url(size), args.analyze_requests)}
+                results.append(result)
+                log(f" p50 {result['p50_ms']:.2f} ms, {result['throughput_per_s']} jobs/s, {result['failed']} failed")
+    finally:
+        server.stop()
+
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "latency_ms": args.latency_ms,
+        # ru_maxrss is KiB on Linux and bytes on macOS
+        "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // (1024 if sys.platform == 'darwin' else 1),
+        "config": {"job_workers": app.job_queue.workers, "pdf_workers": os.environ.get('PDF_WORKERS', '2')},
+        "results": results,
+    }
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+import os
+import random
+
+# Sizes used when no saved pages are supplied
+DEFAULT_SIZES = [10 * 1024, 100 * 1024, 1024 * 1024]
+
+_WORDS = ("web analyzer performance seo content image speed crawl index search "
+          "page title meta header footer layout mobile render script style").split()
+
+
+def generate_page(size, seed=0):
+    """Build a realistic-looking HTML page of roughly ``size`` bytes"""
+    rng = random.Random(seed)
+    head = [
+        "<!DOCTYPE html>",
+        "<html lang=\"en\"><head><meta charset=\"utf-8\">",
+        f"<title>Fixture page {seed} &amp; friends</title>",
+        "<meta name=\"description\" content=\"Synthetic benchmark fixture\">",
+        "<link rel=\"stylesheet\" href=\"/static/site.css\">",
+        "<script src=\"/static/app.js\"></script>",
+        "<style>body{font-family:sans-serif} .card{padding:1em}</style>",
+        "</head><body>",
+        "<h1>Fixture heading</h1>",
+    ]
+    body = []
+    length = sum(len(part) for part in head)
+    n = 0
+    while length < size:
+        n += 1
+        words = ' '.join(rng.choice(_WORDS) for _ in range(rng.randint(20, 60)))
+        alt = f' alt="image {n}"' if rng.random() < 0.7 else ''
+        block = (
+            f"<div class=\"card\" id=\"c{n}\"><h2>Section {n}</h2>"
+            f"<p>{words} <a href=\"/page/{n}\">more</a></p>"
+            f"<img src=\"/img/{n}.jpg\"{alt} width=\"320\" height=\"200\">"
+            f"<!-- card {n} --></div>\n"
+        )
+        if n % 50 == 0:
+            block += "<script>window.analytics && window.analytics.push('<img>');</script>\n"
+        body.append(block)
+        length += len(block)
+    return ''.join(head) + ''.join(body) + "</body></html>\n"
+
+
+def load_corpus(directory=None, sizes=None):
+    """Return [(name, html)] from saved *.html files, or generated pages"""
+    pages = []
+    if directory:
+        for name in sorted(os.listdir(directory)):
+            if name.lower().endswith(('.html', '.htm')):
+                with open(os.path.join(directory, name), 'rb') as f:
+                    pages.append((name, f.read().decode('utf-8', errors='replace')))
+    if not pages:
+        for i, size in enumerate(sizes or DEFAULT_SIZES):
+            pages.append((f"generated_{size // 1024}kb.html", generate_page(size, seed=i)))
+    return pages
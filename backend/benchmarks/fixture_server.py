@@ -0,0 +1,114 @@
+"""Local HTTP server that serves generated HTML fixtures for benchmarks.
+
+GET /page/<bytes>.html returns a page of roughly that many bytes (built once
+with corpus.generate_page and kept in memory); GET /file/<name> serves a page
+from a --corpus directory. Every response waits ``latency`` seconds before
+the headers go out, to stand in for a remote server's think time. HTTP/1.1
+keep-alive is supported, so the fetcher's connection reuse is exercised.
+
+Run standalone with:
+    python backend/benchmarks/fixture_server.py [--port 8765] [--latency-ms 50]
+"""
+import argparse
+import hashlib
+import os
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from benchmarks.corpus import generate_page, load_corpus
+
+_PAGE = re.compile(r'^/page/(\d+)\.html$')
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without TCP_NODELAY every
+    # keep-alive response stalls ~40ms on Nagle + delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        body = self.server.lookup(self.path)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if body is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', '"%s"' % hashlib.md5(body).hexdigest())
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FixtureServer(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, corpus=None):
+        super().__init__((host, port), _Handler)
+        self.latency = latency
+        self._pages = {}
+        self._files = {name: html.encode('utf-8') for name, html in load_corpus(corpus, sizes=[])} if corpus else {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def page_url(self, size):
+        return f"{self.base_url}/page/{size}.html"
+
+    def file_urls(self):
+        return [f"{self.base_url}/file/{name}" for name in sorted(self._files)]
+
+    def lookup(self, path):
+        if path.startswith('/file/'):
+            return self._files.get(path[len('/file/'):])
+        match = _PAGE.match(path)
+        if not match:
+            return None
+        size = int(match.group(1))
+        with self._lock:
+            if size not in self._pages:
+                self._pages[size] = generate_page(size, seed=size).encode('utf-8')
+            return self._pages[size]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='fixture-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--corpus', help='directory of saved HTML pages to serve under /file/')
+    args = parser.parse_args()
+    server = FixtureServer(port=args.port, latency=args.latency_ms / 1000, corpus=args.corpus)
+    print(f"Serving fixtures on {server.base_url} (e.g. {server.page_url(100000)})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Report what importing a backend module costs a fresh worker.
+
+Imports the module in a clean interpreter with ``-X importtime`` and prints
+the slowest imports (self and cumulative time), the per-package totals, the
+wall time and the RSS once the import finished. It also lists any of the
+heavy rendering libraries that got loaded, which should never happen for
+``app``: they belong in the PDF worker processes only.
+
+Usage:
+    python backend/benchmarks/import_cost.py [--module app] [--top 20] [--json out.json]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Should only ever be imported by pdf_report, i.e. inside render workers
+HEAVY = ('matplotlib', 'reportlab', 'PIL', 'numpy', 'lxml', 'bs4')
+
+_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+_PROBE = """
+import resource, sys, time
+start = time.perf_counter()
+import {module}
+wall = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print("PROBE", wall, rss // (1024 if sys.platform == 'darwin' else 1), ",".join(sorted(sys.modules)))
+"""
+
+
+def measure(module):
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', _PROBE.format(module=module)],
+                          cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    probe = [line for line in proc.stdout.splitlines() if line.startswith('PROBE ')]
+    if proc.returncode != 0 or not probe:
+        raise SystemExit(f"importing {module} failed:\n{proc.stderr[-2000:]}")
+    _, wall, rss, modules = probe[-1].split(' ', 3)
+
+    imports = []
+    for line in proc.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            imports.append({"module": name, "self_ms": int(self_us) / 1000,
+                            "cumulative_ms": int(cumulative_us) / 1000, "depth": len(indent) // 2})
+    return {
+        "module": module,
+        "wall_ms": round(float(wall) * 1000, 1),
+        "max_rss_kib": int(rss),
+        "modules_loaded": len(modules.split(',')),
+        "heavy_loaded": sorted({m.split('.')[0] for m in modules.split(',')} & set(HEAVY)),
+        "imports": imports,
+    }
+
+
+def by_package(imports):
+    totals = defaultdict(float)
+    for item in imports:
+        totals[item['module'].split('.')[0]] += item['self_ms']
+    return sorted(totals.items(), key=lambda kv: kv[1], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--json', help='also write the full report here')
+    args = parser.parse_args()
+
+    report = measure(args.module)
+    print(f"import {report['module']}: {report['wall_ms']:.0f} ms, max RSS {report['max_rss_kib'] / 1024:.1f} MiB, "
+          f"{report['modules_loaded']} modules loaded")
+    if report['heavy_loaded']:
+        print(f"  heavy libraries loaded: {', '.join(report['heavy_loaded'])}")
+
+    print(f"\nSlowest imports (cumulative, includes children):")
+    for item in sorted(report['imports'], key=lambda i: i['cumulative_ms'], reverse=True)[:args.top]:
+        print(f"  {item['cumulative_ms']:>9.1f} ms  {item['module']}")
+    print(f"\nBy top-level package (self time):")
+    for package, ms in by_package(report['imports'])[:args.top]:
+        print(f"  {ms:>9.1f} ms  {package}")
+
+    if args.json:
+        report['by_package'] = [{"package": p, "self_ms": round(ms, 3)} for p, ms in by_package(report['imports'])]
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nFull report written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Cache configuration (overridable through the environment)
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')  # memory | sqlite | none
+CACHE_TTL = int(os.environ.get('CACHE_TTL', 600))
+# Expired entries are kept this much longer so they can be revalidated with a
+# conditional GET instead of being re-analyzed from scratch
+CACHE_STALE_TTL = int(os.environ.get('CACHE_STALE_TTL', 24 * 3600))
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 1000))
+CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_BYTES', 16 * 1024 * 1024))
+CACHE_PATH = os.environ.get('CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache.sqlite3'))
+
+
+class MemoryBackend:
+    """In-process LRU store, bounded by entry count and serialized size"""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._items[key] = value
+            self._bytes += len(value)
+            while self._items and (len(self._items) > self.max_entries or self._bytes > self.max_bytes):
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def delete(self, key):
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+
+
+class SQLiteBackend:
+    """SQLite store shared by every gunicorn worker on the host"""
+
+    def __init__(self, path=CACHE_PATH, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed_at)")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._connect()
+        with conn:
+            row = conn.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        return row[0] if row else None
+
+    def set(self, key, value):
+        conn = self._connect()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO results (key, value, size, accessed_at) VALUES (?, ?, ?, ?)",
+                         (key, value, len(value), time.time()))
+            count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+            if count > self.max_entries or total > self.max_bytes:
+                self._evict(conn, count, total)
+
+    def _evict(self, conn, count, total):
+        # Walk least recently used rows until both bounds are met again
+        doomed = []
+        for key, size in conn.execute("SELECT key, size FROM results ORDER BY accessed_at"):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            count -= 1
+            total -= size
+        conn.executemany("DELETE FROM results WHERE key = ?", doomed)
+
+    def delete(self, key):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM results WHERE key = ?", (key,))
+
+
+class ResultCache:
+    """TTL cache of analysis results keyed by normalized URL.
+
+    Each entry keeps the page's ETag / Last-Modified validators. Within the
+    TTL an entry is served as-is; after that it is "stale" and the caller
+    should revalidate it with a conditional GET (see conditional_headers)
+    and call refresh() on a 304.
+    """
+
+    def __init__(self, backend, ttl=CACHE_TTL, stale_ttl=CACHE_STALE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+
+    def get(self, key):
+        """Return (entry, is_fresh), or (None, False) when nothing usable is cached"""
+        raw = self.backend.get(key)
+        if raw is None:
+            self.misses += 1
+            return None, False
+        entry = json.loads(raw)
+        age = time.time() - entry['stored_at']
+        if age > self.ttl + self.stale_ttl:
+            self.backend.delete(key)
+            self.misses += 1
+            return None, False
+        if age <= self.ttl:
+            self.hits += 1
+            return entry, True
+        self.misses += 1
+        return entry, False
+
+    def set(self, key, seo, performance, headers, samples=1):
+        """Store a result; ``samples`` is the latency sample count that was requested for it"""
+        entry = {
+            'seo': seo,
+            'performance': performance,
+            'samples': samples,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'stored_at': time.time(),
+        }
+        self.backend.set(key, json.dumps(entry))
+
+    def refresh(self, key, entry, performance=None):
+        """Restart the TTL of an entry the origin confirmed is unchanged,
+        replacing its performance result with a newly measured one if given"""
+        self.revalidated += 1
+        if performance is not None:
+            entry['performance'] = performance
+        entry['stored_at'] = time.time()
+        self.backend.set(key, json.dumps(entry))
+
+    @staticmethod
+    def conditional_headers(entry):
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+
+def make_cache():
+    """Build the result cache selected by CACHE_BACKEND, or None when disabled"""
+    backend = CACHE_BACKEND.lower()
+    if backend in ('none', 'off', ''):
+        return None
+    if backend == 'sqlite':
+        return ResultCache(SQLiteBackend())
+    return ResultCache(MemoryBackend())
@@ -0,0 +1,296 @@
+import hashlib
+import heapq
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urljoin, urlsplit
+from urllib.robotparser import RobotFileParser
+
+from extractor import extract_seo, iter_decoded
+from fetcher import USER_AGENT, fetch_page, normalize_url
+
+# Crawl configuration (overridable through the environment)
+CRAWL_MAX_PAGES = int(os.environ.get('CRAWL_MAX_PAGES', 200))
+CRAWL_PAGE_LIMIT = int(os.environ.get('CRAWL_PAGE_LIMIT', 50000))  # hard cap for requests
+CRAWL_MAX_DEPTH = int(os.environ.get('CRAWL_MAX_DEPTH', 3))
+CRAWL_CONCURRENCY = int(os.environ.get('CRAWL_CONCURRENCY', 8))
+CRAWL_FRONTIER_LIMIT = int(os.environ.get('CRAWL_FRONTIER_LIMIT', 100000))
+CRAWL_MAX_PAGE_BYTES = int(os.environ.get('CRAWL_MAX_PAGE_BYTES', 5 * 1024 * 1024))
+# Minimum seconds between requests when robots.txt sets no Crawl-delay
+CRAWL_DEFAULT_DELAY = float(os.environ.get('CRAWL_DEFAULT_DELAY', 0))
+
+# Links to these are never HTML pages, so don't spend fetches on them
+SKIP_EXTENSIONS = (
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg', '.ico', '.bmp', '.pdf', '.zip', '.gz',
+    '.tar', '.rar', '.7z', '.mp3', '.mp4', '.avi', '.mov', '.webm', '.css', '.js', '.json',
+    '.xml', '.rss', '.woff', '.woff2', '.ttf', '.eot', '.exe', '.dmg', '.doc', '.docx',
+    '.xls', '.xlsx', '.ppt', '.pptx',
+)
+
+SAMPLE_SIZE = 20
+
+
+def _origin(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def _fingerprint(text):
+    # 64-bit digest: a few dozen bytes per entry instead of the whole string
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8', 'replace'), digest_size=8).digest(), 'big')
+
+
+class SiteAggregate:
+    """Running site-wide SEO metrics; keeps counters and bounded samples only"""
+
+    def __init__(self):
+        self.pages = 0
+        self.failed = 0
+        self.status_codes = Counter()
+        self.missing_title = 0
+        self.missing_meta_description = 0
+        self.missing_h1 = 0
+        self.multiple_h1 = 0
+        self.total_images = 0
+        self.images_without_alt = 0
+        # Pages bucketed by how many of their images lack ALT text
+        self.alt_distribution = Counter()
+        self.response_time_total = 0.0
+        self._titles = {}    # title fingerprint -> [count, title, sample urls]
+        self._slowest = []   # min-heap of (response_time, url)
+        self.samples = {'missing_title': [], 'missing_meta_description': [], 'multiple_h1': [], 'errors': []}
+
+    @staticmethod
+    def _alt_bucket(count):
+        if count == 0:
+            return '0'
+        if count <= 5:
+            return '1-5'
+        if count <= 20:
+            return '6-20'
+        return '21+'
+
+    def _sample(self, name, item):
+        if len(self.samples[name]) < SAMPLE_SIZE:
+            self.samples[name].append(item)
+
+    def add_page(self, url, status_code, seo, response_time):
+        self.pages += 1
+        self.status_codes[status_code] += 1
+        self.response_time_total += response_time
+        if len(self._slowest) < 10:
+            heapq.heappush(self._slowest, (response_time, url))
+        else:
+            heapq.heappushpop(self._slowest, (response_time, url))
+
+        title = seo['title']
+        if title in (None, 'Missing') or not title.strip():
+            self.missing_title += 1
+            self._sample('missing_title', url)
+        else:
+            title = title.strip()
+            entry = self._titles.get(_fingerprint(title))
+            if entry is None:
+                self._titles[_fingerprint(title)] = [1, title[:200], [url]]
+            else:
+                entry[0] += 1
+                if len(entry[2]) < 5:
+                    entry[2].append(url)
+        if seo['meta_description'] == 'Missing':
+            self.missing_meta_description += 1
+            self._sample('missing_meta_description', url)
+        if seo['h1_count'] == 0:
+            self.missing_h1 += 1
+        elif seo['h1_count'] > 1:
+            self.multiple_h1 += 1
+            self._sample('multiple_h1', url)
+        self.total_images += seo['total_images']
+        self.images_without_alt += seo['images_without_alt']
+        self.alt_distribution[self._alt_bucket(seo['images_without_alt'])] += 1
+
+    def add_failure(self, url, error, status_code=None):
+        self.failed += 1
+        if status_code is not None:
+            self.status_codes[status_code] += 1
+        self._sample('errors', {"url": url, "error": error})
+
+    def summary(self):
+        duplicates = sorted((entry for entry in self._titles.values() if entry[0] > 1),
+                            key=lambda entry: entry[0], reverse=True)
+        return {
+            "pages_crawled": self.pages,
+            "pages_failed": self.failed,
+            "status_codes": {str(code): count for code, count in self.status_codes.items()},
+            "pages_missing_title": self.missing_title,
+            "pages_missing_meta_description": self.missing_meta_description,
+            "pages_missing_h1": self.missing_h1,
+            "pages_multiple_h1": self.multiple_h1,
+            "duplicate_title_groups": len(duplicates),
+            "pages_with_duplicate_titles": sum(entry[0] for entry in duplicates),
+            "duplicate_titles": [{"title": e[1], "count": e[0], "sample_urls": e[2]} for e in duplicates[:SAMPLE_SIZE]],
+            "total_images": self.total_images,
+            "images_without_alt": self.images_without_alt,
+            "images_without_alt_distribution": {bucket: self.alt_distribution.get(bucket, 0)
+                                                for bucket in ('0', '1-5', '6-20', '21+')},
+            "average_response_time": round(self.response_time_total / self.pages, 2) if self.pages else None,
+            "slowest_pages": [{"url": url, "response_time": round(rt, 2)}
+                              for rt, url in sorted(self._slowest, reverse=True)],
+            "samples": self.samples,
+        }
+
+
+class SiteCrawler:
+    """Breadth-first, same-origin crawl starting from one URL.
+
+    The frontier is a bounded deque, the seen set holds 64-bit URL
+    fingerprints, and each page is reduced to a handful of counters in a
+    SiteAggregate as soon as it is parsed, so memory grows with the number
+    of URLs seen rather than the size of the pages.
+    """
+
+    def __init__(self, start_url, max_pages=CRAWL_MAX_PAGES, max_depth=CRAWL_MAX_DEPTH,
+                 concurrency=CRAWL_CONCURRENCY, respect_robots=True, progress=None):
+        self.start_url = normalize_url(start_url)
+        self.max_pages = max(1, min(max_pages, CRAWL_PAGE_LIMIT))
+        self.max_depth = max(0, max_depth)
+        self.concurrency = max(1, concurrency)
+        self.respect_robots = respect_robots
+        self.progress = progress
+        self.origins = {_origin(self.start_url)}
+        self.frontier = deque()
+        self.seen = set()
+        self.frontier_dropped = 0
+        self.robots_blocked = 0
+        self.aggregate = SiteAggregate()
+        self._robots = {}
+        self._next_request_at = 0.0
+
+    # robots.txt
+    def _robots_for(self, origin):
+        if origin not in self._robots:
+            parser = RobotFileParser()
+            try:
+                page = fetch_page(origin + '/robots.txt', max_bytes=512 * 1024)
+                if page['status_code'] in (401, 403):
+                    parser.disallow_all = True
+                elif page['status_code'] >= 400:
+                    parser.allow_all = True
+                else:
+                    parser.parse(page['content'].decode('utf-8', errors='replace').splitlines())
+            except Exception as e:
+                print(f"robots.txt fetch failed for {origin}: {str(e)}")
+                parser.allow_all = True
+            self._robots[origin] = parser
+        return self._robots[origin]
+
+    def _allowed(self, url):
+        if not self.respect_robots:
+            return True
+        return self._robots_for(_origin(url)).can_fetch(USER_AGENT, url)
+
+    def _delay(self):
+        delay = None
+        if self.respect_robots:
+            delay = self._robots_for(_origin(self.start_url)).crawl_delay(USER_AGENT)
+        return float(delay) if delay else CRAWL_DEFAULT_DELAY
+
+    # frontier
+    def _enqueue(self, url, depth):
+        key = _fingerprint(url)
+        if key in self.seen:
+            return
+        self.seen.add(key)
+        if len(self.frontier) >= CRAWL_FRONTIER_LIMIT:
+            self.frontier_dropped += 1
+            return
+        self.frontier.append((url, depth))
+
+    def _candidate(self, base, href):
+        href = href.strip()
+        if not href or href.startswith(('#', 'mailto:', 'tel:', 'javascript:', 'data:')):
+            return None
+        url = urljoin(base, href)
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            return None
+        if parts.path.lower().endswith(SKIP_EXTENSIONS):
+            return None
+        url = normalize_url(url)
+        return url if _origin(url) in self.origins else None
+
+    # work
+    def _visit(self, url):
+        page = fetch_page(url, max_bytes=CRAWL_MAX_PAGE_BYTES)
+        content_type = page['headers'].get('Content-Type', '')
+        if page['status_code'] >= 400 or (content_type and 'html' not in content_type.lower()):
+            return page, None
+        seo = extract_seo(iter_decoded(page['content'], page['encoding']), collect_links=True)
+        return page, seo
+
+    def _record(self, url, depth, page, seo):
+        if seo is None:
+            if page['status_code'] >= 400:
+                self.aggregate.add_failure(url, f"HTTP {page['status_code']}", page['status_code'])
+            return
+        self.aggregate.add_page(url, page['status_code'], seo, page['timings']['total'])
+        if url == self.start_url:
+            # Follow the start page's redirect target as part of the same site
+            self.origins.add(_origin(normalize_url(page['final_url'])))
+        if depth >= self.max_depth:
+            return
+        base = urljoin(page['final_url'], seo['base_href']) if seo['base_href'] else page['final_url']
+        for href in seo['links']:
+            link = self._candidate(base, href)
+            if link:
+                self._enqueue(link, depth + 1)
+
+    def run(self):
+        print(f"Crawling {self.start_url} (max {self.max_pages} pages, depth {self.max_depth})")
+        started = time.time()
+        self._enqueue(self.start_url, 0)
+        delay = self._delay()
+        concurrency = 1 if delay else self.concurrency
+        scheduled = 0
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='crawl') as pool:
+            while in_flight or (self.frontier and scheduled < self.max_pages):
+                while self.frontier and scheduled < self.max_pages and len(in_flight) < concurrency:
+                    url, depth = self.frontier.popleft()
+                    if not self._allowed(url):
+                        self.robots_blocked += 1
+                        continue
+                    if delay:
+                        wait_for = self._next_request_at - time.monotonic()
+                        if wait_for > 0:
+                            time.sleep(wait_for)
+                        self._next_request_at = time.monotonic() + delay
+                    in_flight[pool.submit(self._visit, url)] = (url, depth)
+                    scheduled += 1
+                if not in_flight:
+                    continue
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url, depth = in_flight.pop(future)
+                    try:
+                        page, seo = future.result()
+                        self._record(url, depth, page, seo)
+                    except Exception as e:
+                        self.aggregate.add_failure(url, str(e))
+                if self.progress:
+                    self.progress(self.aggregate.pages + self.aggregate.failed, self.max_pages)
+
+        summary = self.aggregate.summary()
+        summary.update({
+            "start_url": self.start_url,
+            "max_pages": self.max_pages,
+            "max_depth": self.max_depth,
+            "urls_discovered": len(self.seen),
+            "urls_not_crawled": len(self.frontier),
+            "frontier_dropped": self.frontier_dropped,
+            "blocked_by_robots": self.robots_blocked,
+            "crawl_delay": delay,
+            "duration_seconds": round(time.time() - started, 2),
+        })
+        print(f"Crawl of {self.start_url} finished: {summary['pages_crawled']} pages in {summary['duration_seconds']}s")
+        return summary
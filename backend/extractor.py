@@ -0,0 +1,298 @@
+import codecs
+import os
+from html import unescape
+from html.entities import html5
+from html.parser import HTMLParser
+
+from metrics import timed
+
+# Which event parser extract_seo() uses: "html.parser" (default, matches the
+# BeautifulSoup(..., "html.parser") results exactly) or "lxml" (faster C
+# parser; libxml2 repairs malformed markup its own way, so titles on broken
+# pages can differ)
+SEO_PARSER = os.environ.get('SEO_PARSER', 'html.parser')
+DECODE_CHUNK_SIZE = 64 * 1024
+
+_etree = False  # not looked up yet
+
+
+def lxml_etree():
+    """lxml.etree, imported on first use; None when lxml isn't installed.
+
+    lxml is optional and only used when asked for, so the default
+    html.parser path never pays for loading libxml2.
+    """
+    global _etree
+    if _etree is False:
+        try:
+            from lxml import etree
+        except ImportError:  # lxml is optional; html.parser is always available
+            etree = None
+        _etree = etree
+    return _etree
+
+# Elements BeautifulSoup closes as soon as they open
+VOID_ELEMENTS = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link',
+    'menuitem', 'meta', 'param', 'source', 'track', 'wbr', 'basefont', 'bgsound',
+    'command', 'frame', 'image', 'isindex', 'nextid', 'spacer',
+])
+
+
+class _SEOSignals:
+    """Single-pass collector for the signals seo_analysis reports.
+
+    Only the <title> subtree is modelled (to reproduce BeautifulSoup's
+    ``Tag.string``); everything else is counted and discarded as it streams by.
+    """
+
+    def __init__(self, collect_links=False, collect_resources=False):
+        self.links = [] if collect_links else None
+        self.resources = [] if collect_resources else None
+        self.base_href = None
+        self._in_head = False
+        self.meta_description = False
+        self.h1_count = 0
+        self.total_images = 0
+        self.images_without_alt = 0
+        self.title_seen = False
+        self.title_done = False
+        self.title_root = None
+        self._title_nodes = []   # open nodes inside <title>, root first
+        self._open = []          # open element names, tracked until </title>
+        self._text_open = False  # last title child is a text run still growing
+
+    def start(self, tag, attrs):
+        if tag == 'img':
+            self.total_images += 1
+            if not attrs.get('alt'):
+                self.images_without_alt += 1
+        elif tag == 'h1':
+            self.h1_count += 1
+        elif tag == 'meta' and attrs.get('name') == 'description':
+            self.meta_description = True
+        elif tag == 'base' and attrs.get('href') and self.base_href is None:
+            self.base_href = attrs['href']
+        elif self.links is not None:
+            if tag == 'a' and attrs.get('href') and 'nofollow' not in (attrs.get('rel') or '').lower().split():
+                self.links.append(attrs['href'])
+        if self.resources is not None:
+            self._resource(tag, attrs)
+
+        if self.title_done:
+            return
+        self._text_open = False
+        if self._title_nodes:
+            node = {'children': []}
+            self._title_nodes[-1]['children'].append(node)
+            self._title_nodes.append(node)
+        elif tag == 'title':
+            self.title_seen = True
+            self.title_root = {'children': []}
+            self._title_nodes.append(self.title_root)
+        self._open.append(tag)
+        if tag in VOID_ELEMENTS:
+            self.end(tag)
+
+    def _resource(self, tag, attrs):
+        # Subresources the browser fetches; "blocking" marks the critical
+        # path: stylesheets and classic synchronous scripts in <head>
+        if tag == 'head':
+            self._in_head = True
+        elif tag == 'body':
+            self._in_head = False
+        elif tag == 'img' and attrs.get('src'):
+            self.resources.append({"url": attrs['src'], "type": "image", "blocking": False})
+        elif tag == 'script' and attrs.get('src'):
+            blocking = (self._in_head and 'async' not in attrs and 'defer' not in attrs
+                        and (attrs.get('type') or '').lower() != 'module')
+            self.resources.append({"url": attrs['src'], "type": "script", "blocking": blocking})
+        elif tag == 'link' and attrs.get('href'):
+            rel = (attrs.get('rel') or '').lower().split()
+            if 'stylesheet' in rel:
+                media = (attrs.get('media') or 'all').strip().lower()
+                self.resources.append({"url": attrs['href'], "type": "stylesheet",
+                                       "blocking": media in ('all', 'screen')})
+            elif 'icon' in rel:
+                self.resources.append({"url": attrs['href'], "type": "image", "blocking": False})
+            elif 'preload' in rel and (attrs.get('as') or '').lower() == 'font':
+                self.resources.append({"url": attrs['href'], "type": "font", "blocking": False})
+
+    def end(self, tag):
+        if tag == 'head':
+            self._in_head = False
+        if self.title_done:
+            return
+        self._text_open = False
+        if tag not in self._open:
+            return
+        # Pop up to and including the most recent element with this name
+        while self._open:
+            name = self._open.pop()
+            if self._title_nodes:
+                self._title_nodes.pop()
+                if not self._title_nodes:
+                    self.title_done = True
+            if name == tag:
+                break
+
+    def text(self, data, merge=True):
+        if not self._title_nodes:
+            return
+        children = self._title_nodes[-1]['children']
+        if merge and self._text_open:
+            children[-1] += data
+        else:
+            children.append(data)
+        self._text_open = merge
+
+    def result(self):
+        if not self.title_seen:
+            title = "Missing"
+        else:
+            title = _node_string(self.title_root)
+        result = {
+            "title": title,
+            "meta_description": "Present" if self.meta_description else "Missing",
+            "h1_count": self.h1_count,
+            "images_without_alt": self.images_without_alt,
+            "total_images": self.total_images,
+        }
+        if self.links is not None:
+            result["links"] = self.links
+        if self.resources is not None:
+            result["resources"] = self.resources
+        if self.links is not None or self.resources is not None:
+            result["base_href"] = self.base_href
+        return result
+
+
+_ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+
+
+def _node_string(node):
+    # Same rule as BeautifulSoup's Tag.string: a lone string child, or the
+    # .string of a lone element child; None otherwise
+    children = node['children']
+    if len(children) != 1:
+        return None
+    child = children[0]
+    if isinstance(child, str):
+        # bs4 collapses whitespace-only strings to a single newline or space
+        if not child.strip(_ASCII_SPACES):
+            return '\n' if '\n' in child else ' '
+        return child
+    return _node_string(child)
+
+
+class _HTMLParserExtractor(HTMLParser):
+    """html.parser callbacks mirroring bs4's HTMLParserTreeBuilder"""
+
+    def __init__(self, collect_links=False, collect_resources=False):
+        # bs4 resolves character references itself, so do the same
+        super().__init__(convert_charrefs=False)
+        self.signals = _SEOSignals(collect_links, collect_resources)
+
+    def handle_starttag(self, tag, attrs):
+        self.signals.start(tag, {k: ('' if v is None else v) for k, v in attrs})
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS:
+            self.signals.end(tag)
+
+    def handle_endtag(self, tag):
+        self.signals.end(tag)
+
+    def handle_data(self, data):
+        self.signals.text(data)
+
+    def handle_charref(self, name):
+        if self.signals._title_nodes:
+            # Numeric references resolve per HTML5 (windows-1252 remapping, U+FFFD for invalid)
+            self.signals.text(unescape('&#%s;' % name))
+
+    def handle_entityref(self, name):
+        if not self.signals._title_nodes:
+            return
+        character = html5.get(name + ';')
+        self.signals.text(character if character is not None else "&%s" % name)
+
+    def handle_comment(self, data):
+        self.signals.text(data, merge=False)
+
+    def handle_decl(self, data):
+        self.signals.text(data, merge=False)
+
+    def unknown_decl(self, data):
+        self.signals.text(data[len('CDATA['):] if data.upper().startswith('CDATA[') else data, merge=False)
+
+    def handle_pi(self, data):
+        self.signals.text(data, merge=False)
+
+
+class _LxmlTarget:
+    """lxml parser target feeding the same collector"""
+
+    def __init__(self, collect_links=False, collect_resources=False):
+        self.signals = _SEOSignals(collect_links, collect_resources)
+
+    def start(self, tag, attrib):
+        self.signals.start(tag, attrib)
+
+    def end(self, tag):
+        if tag not in VOID_ELEMENTS:
+            self.signals.end(tag)
+
+    def data(self, data):
+        self.signals.text(data)
+
+    def comment(self, text):
+        self.signals.text(text, merge=False)
+
+    def close(self):
+        return self.signals
+
+
+def iter_decoded(content, encoding, chunk_size=DECODE_CHUNK_SIZE):
+    """Decode a response body in chunks, as ``requests.Response.text`` would"""
+    try:
+        decoder = codecs.getincrementaldecoder(encoding or 'utf-8')(errors='replace')
+    except LookupError:
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    view = memoryview(content)
+    for offset in range(0, len(view), chunk_size):
+        text = decoder.decode(view[offset:offset + chunk_size])
+        if text:
+            yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+@timed('parse')
+def extract_seo(chunks, parser=None, collect_links=False, collect_resources=False):
+    """Collect title, meta description, H1 and image signals in one pass.
+
+    ``chunks`` is any iterable of text fragments; no document tree is built
+    and nothing but the counters and the <title> subtree is retained.
+    Returns the seo_analysis fields (everything except "url"); with
+    ``collect_links`` it also returns the followable <a href> values
+    ("links", rel=nofollow skipped) and the document's <base href>; with
+    ``collect_resources`` the images, scripts, stylesheets and preloaded
+    fonts the page loads ("resources": url, type, blocking).
+    """
+    parser = parser or SEO_PARSER
+    etree = lxml_etree() if parser == 'lxml' else None
+    if etree is not None:
+        target = _LxmlTarget(collect_links, collect_resources)
+        lxml_parser = etree.HTMLParser(target=target)
+        for chunk in chunks:
+            lxml_parser.feed(chunk)
+        return lxml_parser.close().result()
+
+    extractor = _HTMLParserExtractor(collect_links, collect_resources)
+    for chunk in chunks:
+        extractor.feed(chunk)
+    extractor.close()
+    return extractor.signals.result()
@@ -0,0 +1,324 @@
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, LocationParseError, NewConnectionError
+from urllib3.util.connection import allowed_gai_family
+from urllib3.util.retry import Retry
+
+from metrics import timed
+
+# Client configuration (overridable through the environment)
+FETCH_TIMEOUT = float(os.environ.get('FETCH_TIMEOUT', 10))
+FETCH_RETRIES = int(os.environ.get('FETCH_RETRIES', 2))
+FETCH_BACKOFF = float(os.environ.get('FETCH_BACKOFF', 0.5))
+FETCH_POOL_SIZE = int(os.environ.get('FETCH_POOL_SIZE', 10))
+FETCH_PER_HOST_LIMIT = int(os.environ.get('FETCH_PER_HOST_LIMIT', 4))
+# Seconds a fetch waits for one of its host's slots before giving up with
+# HostBusy; 0 waits as long as it takes (every holder is bounded by its own timeouts)
+FETCH_HOST_WAIT = float(os.environ.get('FETCH_HOST_WAIT', 0))
+FETCH_MAX_BYTES = int(os.environ.get('FETCH_MAX_BYTES', 10 * 1024 * 1024))
+FETCH_CHUNK_SIZE = 64 * 1024
+USER_AGENT = os.environ.get('FETCH_USER_AGENT', 'WebAnalyzer/1.0 (+https://github.com/Harshavardhan-katta/WebAnalyzer)')
+
+
+class ResponseTooLarge(Exception):
+    pass
+
+
+class HostBusy(Exception):
+    pass
+
+# Errors a retry can't fix: a malformed URL or a page over the size limit
+_PERMANENT_ERRORS = (ResponseTooLarge, requests.exceptions.InvalidURL, requests.exceptions.MissingSchema,
+                     requests.exceptions.InvalidSchema, LocationParseError)
+# Lookup failures meaning the name doesn't exist (not "try again later")
+_UNKNOWN_HOST = {socket.EAI_NONAME, getattr(socket, 'EAI_NODATA', socket.EAI_NONAME)}
+
+
+def permanent_failure(error):
+    """True if ``error``, or anything that led to it, will recur on retry:
+    an unknown host, a malformed URL, an oversized page or a 4xx response"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, _PERMANENT_ERRORS):
+            return True
+        if isinstance(error, socket.gaierror) and error.errno in _UNKNOWN_HOST:
+            return True
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+        if status and 400 <= status < 500 and status not in (408, 429):
+            return True
+        # Follow wrapped errors: raise-from/except chains and urllib3's MaxRetryError.reason
+        reason = getattr(error, 'reason', None)
+        error = error.__cause__ or error.__context__ or (reason if isinstance(reason, BaseException) else None)
+    return False
+
+
+# Per-thread timing record filled in by the connection classes below while a
+# fetch is in progress on that thread
+_timing_state = threading.local()
+
+
+def _current_timings():
+    return getattr(_timing_state, 'timings', None)
+
+
+def _ms(seconds):
+    return seconds * 1000
+
+
+class _TimedConnectionMixin:
+    """Records DNS, TCP connect and TLS handshake time for new connections"""
+
+    def _new_conn(self):
+        timings = _current_timings()
+        if timings is None:
+            return super()._new_conn()
+
+        host = self._dns_host
+        start = time.perf_counter()
+        try:
+            infos = socket.getaddrinfo(host, self.port, allowed_gai_family(), socket.SOCK_STREAM)
+        except socket.gaierror:
+            # Let urllib3 raise its own NewConnectionError for the lookup failure
+            return super()._new_conn()
+        resolved = time.perf_counter()
+        timings['dns'] += _ms(resolved - start)
+
+        # Try every resolved address in order, like urllib3's create_connection,
+        # so a dead first address (or broken IPv6) falls through to the next.
+        # SNI and the Host header still use self.host
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        try:
+            for i, addr in enumerate(addresses):
+                self._dns_host = addr
+                try:
+                    return super()._new_conn()
+                except (NewConnectionError, ConnectTimeoutError):
+                    if i == len(addresses) - 1:
+                        raise
+        finally:
+            self._dns_host = host
+            timings['connect'] += _ms(time.perf_counter() - resolved)
+
+    def connect(self):
+        timings = _current_timings()
+        if timings is None:
+            return super().connect()
+
+        before = timings['dns'] + timings['connect']
+        start = time.perf_counter()
+        super().connect()
+        elapsed = _ms(time.perf_counter() - start)
+        timings['new_connections'] += 1
+        if isinstance(self, HTTPSConnection):
+            # Whatever connect() spent beyond DNS + TCP went into the TLS handshake
+            spent = timings['dns'] + timings['connect'] - before
+            timings['tls'] += max(0.0, elapsed - spent)
+
+
+class TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose pools use the timing connection classes"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': TimedHTTPConnectionPool,
+            'https': TimedHTTPSConnectionPool,
+        }
+
+
+def _new_session():
+    session = requests.Session()
+    # Only connection and read errors are retried. Error statuses are part of
+    # what is measured, and honouring a site's Retry-After would let it stall
+    # the fetch (and inflate its timings) for as long as it asks
+    retries = Retry(
+        total=FETCH_RETRIES,
+        connect=FETCH_RETRIES,
+        read=FETCH_RETRIES,
+        status=0,
+        backoff_factor=FETCH_BACKOFF,
+        status_forcelist=(),
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        raise_on_status=False,
+        respect_retry_after_header=False,
+    )
+    adapter = TimedHTTPAdapter(pool_connections=FETCH_POOL_SIZE,
+                               pool_maxsize=FETCH_POOL_SIZE,
+                               max_retries=retries)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = USER_AGENT
+    return session
+
+
+# One keep-alive session per thread: requests.Session is not thread-safe, but
+# each worker thread reuses its own connection pools across fetches
+_sessions = threading.local()
+
+
+def get_session():
+    session = getattr(_sessions, 'session', None)
+    if session is None:
+        session = _new_session()
+        _sessions.session = session
+    return session
+
+
+# Per-host concurrency caps shared by every thread in the process. A host's
+# entry lives only while some fetch holds or waits for one of its slots
+_host_slots = {}  # host -> [semaphore, holders and waiters]
+_host_slots_lock = threading.Lock()
+
+
+@contextmanager
+def host_slot(host, timeout=None):
+    """Hold one of ``host``'s FETCH_PER_HOST_LIMIT slots, queuing for it if need be.
+    ``timeout`` (default FETCH_HOST_WAIT, 0 for none) bounds the wait"""
+    timeout = FETCH_HOST_WAIT if timeout is None else timeout
+    with _host_slots_lock:
+        slot = _host_slots.get(host)
+        if slot is None:
+            slot = _host_slots[host] = [threading.BoundedSemaphore(FETCH_PER_HOST_LIMIT), 0]
+        slot[1] += 1
+    try:
+        if not slot[0].acquire(timeout=timeout if timeout > 0 else None):
+            raise HostBusy(f"Too many concurrent requests to {host}")
+        try:
+            yield
+        finally:
+            slot[0].release()
+    finally:
+        with _host_slots_lock:
+            slot[1] -= 1
+            if not slot[1]:
+                del _host_slots[host]
+
+
+def read_body(response, max_bytes=None):
+    """Read a streamed response body, refusing anything over max_bytes"""
+    max_bytes = FETCH_MAX_BYTES if max_bytes is None else max_bytes
+    declared = response.headers.get('Content-Length')
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        response.close()
+        raise ResponseTooLarge(f"Response is {int(declared)} bytes (limit {max_bytes})")
+
+    chunks = []
+    size = 0
+    for chunk in response.iter_content(FETCH_CHUNK_SIZE):
+        size += len(chunk)
+        if size > max_bytes:
+            response.close()
+            raise ResponseTooLarge(f"Response exceeded {max_bytes} bytes")
+        chunks.append(chunk)
+    content = b''.join(chunks)
+    # Keep response.text / apparent_encoding usable after streaming
+    response._content = content
+    return content
+
+
+def normalize_scheme(url):
+    if not url.lower().startswith(('http://', 'https://')):
+        url = 'https://' + url
+    return url
+
+
+def normalize_url(url):
+    """Canonical form of a URL for use as a cache or dedup key.
+
+    Lowercases the scheme and host, drops default ports and the fragment,
+    gives an empty path a trailing slash and sorts the query parameters.
+    """
+    parts = urlsplit(normalize_scheme(url.strip()))
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').rstrip('.')
+    if ':' in host:
+        host = f"[{host}]"
+    port = parts.port
+    if port and not ((scheme == 'http' and port == 80) or (scheme == 'https' and port == 443)):
+        host = f"{host}:{port}"
+    path = parts.path or '/'
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, path, query, ''))
+
+
+@timed('fetch')
+def fetch_page(url, timeout=None, max_bytes=None, headers=None):
+    """Download a page once and record where the time went.
+
+    Uses the calling thread's pooled keep-alive session, holds one of the
+    host's concurrency slots for the duration of the request and stops
+    reading once the body exceeds ``max_bytes``. Extra request ``headers``
+    (e.g. If-None-Match) are sent as given.
+
+    Returns a dict with the response status, headers, raw body bytes, the
+    encoding requests would use for ``response.text`` and a ``timings`` dict
+    (milliseconds): dns, connect, tls, ttfb (request start to response
+    headers, like curl's time_starttransfer), download and total. Connect
+    and TLS are zero when a pooled connection was reused.
+    """
+    url = normalize_scheme(url)
+    timeout = FETCH_TIMEOUT if timeout is None else timeout
+    timings = {
+        'dns': 0.0,
+        'connect': 0.0,
+        'tls': 0.0,
+        'ttfb': 0.0,
+        'download': 0.0,
+        'total': 0.0,
+        'new_connections': 0,
+    }
+
+    session = get_session()
+    with host_slot(urlsplit(url).hostname or ''):
+        _timing_state.timings = timings
+        start = time.perf_counter()
+        try:
+            response = session.get(url, timeout=timeout, stream=True, headers=headers)
+            headers_at = time.perf_counter()
+            try:
+                content = read_body(response, max_bytes)
+            finally:
+                response.close()
+            done = time.perf_counter()
+        finally:
+            _timing_state.timings = None
+
+    timings['ttfb'] = _ms(headers_at - start)
+    timings['download'] = _ms(done - headers_at)
+    timings['total'] = _ms(done - start)
+
+    return {
+        'url': url,
+        'final_url': response.url,
+        'status_code': response.status_code,
+        'headers': response.headers,
+        'content': content,
+        'encoding': response.encoding or response.apparent_encoding,
+        'timings': timings,
+    }
@@ -0,0 +1,238 @@
+"""Vectorized scoring and portfolio summaries over many analysis results.
+
+Results are turned into one NumPy array per field (to_columns), scored with
+the same formulas as the single-URL path (score_columns) and summarized
+across the whole fleet (portfolio_summary / portfolio_report). Used for
+batch summaries; a saved /analyze/batch NDJSON stream can also be
+summarized offline with:
+
+    python backend/fleet.py results.ndjson [--json] [--top 10]
+"""
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from scoring import (FAIR_SCORE, FAST_RESPONSE_MS, GOOD_SCORE, MIN_SCORE, PAGE_WEIGHT_SHARE,
+                     TIMING_SHARE)
+
+_PERCENTILES = (10, 25, 50, 75, 90)
+_RATINGS = ('Good', 'Fair', 'Needs Work')
+# Page weight fields used by page_weight_scores(); NaN for sites analyzed without deep mode
+_WEIGHT_FIELDS = ('total_bytes', 'requests', 'critical_path_bytes', 'blocking_resources',
+                  'compressible', 'compressed', 'cacheable', 'resources_measured')
+
+
+def _pairs(results):
+    for item in results:
+        if isinstance(item, dict):
+            if item.get('type', 'result') == 'result':
+                yield item.get('url') or item['seo']['url'], item['seo'], item['performance']
+        else:
+            seo, performance = item
+            yield seo['url'], seo, performance
+
+
+def to_columns(results):
+    """Columnar view of analysis results.
+
+    ``results`` holds /analyze/batch result items or (seo, performance)
+    pairs; error items are skipped. Returns a dict of equal-length arrays.
+    """
+    url, score, response_time, ttfb, download, status_code = [], [], [], [], [], []
+    has_title, has_meta, h1_count, total_images, images_without_alt = [], [], [], [], []
+    weights = {field: [] for field in _WEIGHT_FIELDS}
+    # Gathered into lists and converted once; filling arrays element by element is far slower
+    for site, seo, performance in _pairs(results):
+        # Scores use the sampled medians when present, like compute_performance_score
+        latency = performance.get('latency')
+        timings = performance.get('timings') or {}
+        url.append(site)
+        score.append(performance['score'])
+        response_time.append(performance['response_time'])
+        ttfb.append(latency['ttfb']['p50'] if latency else timings.get('ttfb', np.nan))
+        download.append(latency['download']['p50'] if latency else timings.get('download', np.nan))
+        status_code.append(performance['status_code'])
+        has_title.append(seo['title'] != 'Missing')
+        has_meta.append(seo['meta_description'] == 'Present')
+        h1_count.append(seo['h1_count'])
+        total_images.append(seo['total_images'])
+        images_without_alt.append(seo['images_without_alt'])
+        weight = performance.get('page_weight') or {}
+        for field in _WEIGHT_FIELDS:
+            weights[field].append(weight.get(field, np.nan))
+
+    return {
+        "url": np.array(url, dtype=object),
+        "reported_score": np.array(score, dtype=np.int64),
+        "response_time": np.array(response_time, dtype=float),
+        "ttfb": np.array(ttfb, dtype=float),
+        "download": np.array(download, dtype=float),
+        "status_code": np.array(status_code, dtype=np.int64),
+        "has_title": np.array(has_title, dtype=bool),
+        "has_meta_description": np.array(has_meta, dtype=bool),
+        "h1_count": np.array(h1_count, dtype=np.int64),
+        "total_images": np.array(total_images, dtype=np.int64),
+        "images_without_alt": np.array(images_without_alt, dtype=np.int64),
+        **{field: np.array(values, dtype=float) for field, values in weights.items()},
+    }
+
+
+def performance_scores(ttfb, download):
+    """compute_performance_score over arrays of p50 TTFB and download times"""
+    penalty = ttfb / 10 + download / 20
+    return np.clip(np.trunc(100 - penalty), MIN_SCORE, 100).astype(np.int64)
+
+
+def page_weight_scores(columns):
+    """page_weight.page_weight_score over arrays; NaN where no page weight was measured"""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        score = np.full(len(columns['total_bytes']), 100.0)
+        mb = columns['total_bytes'] / (1024 * 1024)
+        score -= np.maximum(0.0, mb - 1.5) * 15
+        score -= np.maximum(0, columns['requests'] - 50) * 0.5
+        critical_kb = columns['critical_path_bytes'] / 1024
+        score -= np.maximum(0.0, critical_kb - 170) / 20
+        score -= columns['blocking_resources'] * 2
+        compressible = columns['compressible']
+        score -= np.where(compressible > 0, 20 * (1 - columns['compressed'] / compressible), 0)
+        measured = columns['resources_measured']
+        score -= np.where(measured > 0, 10 * (1 - columns['cacheable'] / measured), 0)
+        return np.where(np.isnan(score), np.nan, np.clip(np.trunc(score), 0, 100))
+
+
+def ratings(scores):
+    return np.select([scores >= GOOD_SCORE, scores >= FAIR_SCORE], list(_RATINGS[:2]), _RATINGS[2])
+
+
+def score_columns(columns):
+    """Add score, rating, speed, fleet rank and percentile columns (in place) and return them.
+
+    Rank 1 is the best site: highest score, then fastest response time.
+    Percentile is the share of the fleet the site beats.
+    """
+    timing = performance_scores(columns['ttfb'], columns['download'])
+    weight = page_weight_scores(columns)
+    blended = np.round(TIMING_SHARE * timing + PAGE_WEIGHT_SHARE * np.nan_to_num(weight))
+    score = np.where(np.isnan(weight), timing, blended).astype(np.int64)
+
+    n = len(score)
+    order = np.lexsort((columns['response_time'], -score))
+    rank = np.empty(n, dtype=np.int64)
+    rank[order] = np.arange(1, n + 1)
+
+    columns.update({
+        "timing_score": timing,
+        "page_weight_score": weight,
+        "score": score,
+        "rating": ratings(score),
+        "speed": np.where(columns['response_time'] < FAST_RESPONSE_MS, 'Fast', 'Slow'),
+        "rank": rank,
+        "percentile": np.round(100 * (n - rank) / max(n - 1, 1), 1),
+    })
+    return columns
+
+
+def _percentiles(values):
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return None
+    stats = np.percentile(values, _PERCENTILES)
+    return {"mean": round(float(values.mean()), 2), "min": round(float(values.min()), 2),
+            **{f"p{p}": round(float(v), 2) for p, v in zip(_PERCENTILES, stats)},
+            "max": round(float(values.max()), 2)}
+
+
+def _sites(columns, indices):
+    return [{"url": columns['url'][i], "score": int(columns['score'][i]),
+             "response_time": round(float(columns['response_time'][i]), 2), "rank": int(columns['rank'][i])}
+            for i in indices]
+
+
+def portfolio_summary(columns, top=5):
+    """Fleet-wide figures for scored columns (see score_columns)"""
+    n = len(columns['score'])
+    if not n:
+        return {"sites": 0}
+    order = np.argsort(columns['rank'])
+    rating_counts = dict(zip(*np.unique(columns['rating'], return_counts=True)))
+    deep = ~np.isnan(columns['page_weight_score'])
+    return {
+        "sites": n,
+        "score": _percentiles(columns['score'].astype(float)),
+        "response_time": _percentiles(columns['response_time']),
+        "ttfb": _percentiles(columns['ttfb']),
+        "ratings": {rating: int(rating_counts.get(rating, 0)) for rating in _RATINGS},
+        "fast": int(np.count_nonzero(columns['speed'] == 'Fast')),
+        "slow": int(np.count_nonzero(columns['speed'] == 'Slow')),
+        "http_errors": int(np.count_nonzero((columns['status_code'] < 200) | (columns['status_code'] >= 400))),
+        "seo": {
+            "missing_title": int(np.count_nonzero(~columns['has_title'])),
+            "missing_meta_description": int(np.count_nonzero(~columns['has_meta_description'])),
+            "no_h1": int(np.count_nonzero(columns['h1_count'] == 0)),
+            "multiple_h1": int(np.count_nonzero(columns['h1_count'] > 1)),
+            "sites_with_images_without_alt": int(np.count_nonzero(columns['images_without_alt'] > 0)),
+            "images_without_alt": int(columns['images_without_alt'].sum()),
+            "alt_coverage": (round(float(1 - columns['images_without_alt'].sum() / columns['total_images'].sum()), 3)
+                             if columns['total_images'].sum() else None),
+        },
+        "page_weight": {
+            "sites": int(np.count_nonzero(deep)),
+            "score": _percentiles(columns['page_weight_score']),
+            "total_bytes": _percentiles(columns['total_bytes']),
+        } if deep.any() else None,
+        "best": _sites(columns, order[:top]),
+        "worst": _sites(columns, order[::-1][:top]),
+        # Sites whose stored score differs from a rescore of their measurements
+        "score_drift": int(np.count_nonzero(columns['score'] != columns['reported_score'])),
+    }
+
+
+def portfolio_report(summary):
+    """Plain-text portfolio section for batch emails and the command line"""
+    if not summary.get('sites'):
+        return "PORTFOLIO SUMMARY\n\nNo successful analyses.\n"
+    score, response_time, seo = summary['score'], summary['response_time'], summary['seo']
+    lines = [
+        "PORTFOLIO SUMMARY",
+        "",
+        f"Sites scored: {summary['sites']}",
+        f"Performance score: median {score['p50']:.0f}, p10 {score['p10']:.0f}, p90 {score['p90']:.0f} "
+        f"(mean {score['mean']:.1f})",
+        f"Response time: median {response_time['p50']:.0f}ms, p90 {response_time['p90']:.0f}ms, "
+        f"max {response_time['max']:.0f}ms",
+        "Ratings: " + ", ".join(f"{rating} {count}" for rating, count in summary['ratings'].items()),
+        f"Fast / slow (under {FAST_RESPONSE_MS}ms): {summary['fast']} / {summary['slow']}",
+        f"HTTP errors: {summary['http_errors']}",
+        f"Missing title: {seo['missing_title']}, missing meta description: {seo['missing_meta_description']}",
+        f"No H1: {seo['no_h1']}, multiple H1: {seo['multiple_h1']}",
+        f"Images without ALT: {seo['images_without_alt']} on {seo['sites_with_images_without_alt']} sites",
+    ]
+    if summary['page_weight']:
+        weight = summary['page_weight']
+        lines.append(f"Page weight ({weight['sites']} sites): median {weight['total_bytes']['p50'] / 1024:.0f} KB, "
+                     f"median score {weight['score']['p50']:.0f}")
+    for title, key in (("BEST", 'best'), ("WORST", 'worst')):
+        lines += ["", f"{title}:"]
+        lines += [f"{site['rank']}. {site['url']}: score {site['score']}/100, {site['response_time']:.0f}ms"
+                  for site in summary[key]]
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Portfolio summary of a saved /analyze/batch NDJSON stream")
+    parser.add_argument('path', nargs='?', default='-', help="NDJSON file (default: stdin)")
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--json', action='store_true', help="print the summary as JSON")
+    args = parser.parse_args()
+
+    stream = sys.stdin if args.path == '-' else open(args.path, encoding='utf-8')
+    with stream:
+        items = [json.loads(line) for line in stream if line.strip()]
+    summary = portfolio_summary(score_columns(to_columns(items)), top=args.top)
+    print(json.dumps(summary, indent=2) if args.json else portfolio_report(summary))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from fetcher import normalize_url
+from latency import percentile
+
+# History store configuration (overridable through the environment)
+HISTORY_ENABLED = os.environ.get('HISTORY_ENABLED', '1').lower() in ('1', 'true', 'yes')
+HISTORY_PATH = os.environ.get('HISTORY_PATH', os.path.join(os.path.dirname(__file__), 'history.sqlite3'))
+# Buffered rows are written in one transaction every interval or batch size
+HISTORY_FLUSH_INTERVAL = float(os.environ.get('HISTORY_FLUSH_INTERVAL', 1.0))
+HISTORY_FLUSH_ROWS = int(os.environ.get('HISTORY_FLUSH_ROWS', 500))
+
+DAY_MS = 86400 * 1000
+
+# One row per analysis; numbers only, in the order written by _row()
+_COLUMNS = ('site_id', 'ts', 'score', 'response_time', 'ttfb', 'response_time_p90', 'jitter', 'status_code',
+            'has_title', 'has_meta_description', 'h1_count', 'total_images', 'images_without_alt',
+            'page_bytes', 'requests')
+
+
+def _median(values):
+    return percentile(values, 50) if values else None
+
+
+def _round(value, digits=2):
+    return None if value is None else round(value, digits)
+
+
+class HistoryStore:
+    """Every analysis result, queryable by site and time.
+
+    Runs live in a WITHOUT ROWID table keyed by (site_id, ts), so one site's
+    history is a contiguous range of the primary key and a year of daily
+    runs is read with a single short index scan however many sites share
+    the file. Sites are interned once and carry their run count and latest
+    values, so listing sites never scans the runs table. Writes are
+    buffered and flushed in bulk, which is also how batch runs land.
+    """
+
+    def __init__(self, path=HISTORY_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._site_ids = {}
+        self._pending = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._flusher = None
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sites (
+                    id INTEGER PRIMARY KEY,
+                    site TEXT NOT NULL UNIQUE,
+                    runs INTEGER NOT NULL DEFAULT 0,
+                    first_ts INTEGER,
+                    last_ts INTEGER,
+                    last_score INTEGER,
+                    last_response_time REAL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    site_id INTEGER NOT NULL,
+                    ts INTEGER NOT NULL,
+                    score INTEGER,
+                    response_time REAL,
+                    ttfb REAL,
+                    response_time_p90 REAL,
+                    jitter REAL,
+                    status_code INTEGER,
+                    has_title INTEGER,
+                    has_meta_description INTEGER,
+                    h1_count INTEGER,
+                    total_images INTEGER,
+                    images_without_alt INTEGER,
+                    page_bytes INTEGER,
+                    requests INTEGER,
+                    PRIMARY KEY (site_id, ts)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS sites_last_ts ON sites (last_ts)")
+        atexit.register(self.flush)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # writes
+    @staticmethod
+    def _row(seo, performance, ts):
+        latency = performance.get('latency') or {}
+        weight = performance.get('page_weight') or {}
+        return (
+            ts,
+            performance['score'],
+            performance['response_time'],
+            (latency.get('ttfb') or {}).get('p50', (performance.get('timings') or {}).get('ttfb')),
+            (latency.get('total') or {}).get('p90'),
+            latency.get('jitter'),
+            performance['status_code'],
+            int(seo['title'] != 'Missing'),
+            int(seo['meta_description'] == 'Present'),
+            seo['h1_count'],
+            seo['total_images'],
+            seo['images_without_alt'],
+            weight.get('total_bytes'),
+            weight.get('requests'),
+        )
+
+    def record(self, seo, performance, ts=None):
+        """Queue one analysis for the next bulk write"""
+        row = self._row(seo, performance, int((ts or time.time()) * 1000))
+        with self._lock:
+            self._pending.append((normalize_url(seo['url']), row))
+            full = len(self._pending) >= HISTORY_FLUSH_ROWS
+            if self._flusher is None:
+                # Started lazily so that gunicorn forks before any threads exist
+                self._flusher = threading.Thread(target=self._flush_loop, name='history-flush', daemon=True)
+                self._flusher.start()
+        if full:
+            self._wakeup.set()
+
+    def _flush_loop(self):
+        while True:
+            self._wakeup.wait(HISTORY_FLUSH_INTERVAL)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"History flush failed: {str(e)}")
+
+    def _site_id(self, conn, site):
+        site_id = self._site_ids.get(site)
+        if site_id is None:
+            conn.execute("INSERT OR IGNORE INTO sites (site) VALUES (?)", (site,))
+            site_id = conn.execute("SELECT id FROM sites WHERE site = ?", (site,)).fetchone()[0]
+            self._site_ids[site] = site_id
+        return site_id
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return 0
+        conn = self._connect()
+        with conn:
+            rows = []
+            latest = {}
+            for site, row in pending:
+                site_id = self._site_id(conn, site)
+                rows.append((site_id,) + row)
+                count, first, _ = latest.get(site_id, (0, row[0], None))
+                latest[site_id] = (count + 1, min(first, row[0]), row)
+            # Same-millisecond duplicates for a site replace each other
+            conn.executemany(f"INSERT OR REPLACE INTO runs ({', '.join(_COLUMNS)}) "
+                             f"VALUES ({', '.join('?' * len(_COLUMNS))})", rows)
+            conn.executemany("""
+                UPDATE sites SET runs = runs + ?, first_ts = COALESCE(first_ts, ?), last_ts = ?,
+                                 last_score = ?, last_response_time = ?
+                WHERE id = ?
+            """, [(count, first, row[0], row[1], row[2], site_id) for site_id, (count, first, row) in latest.items()])
+        return len(rows)
+
+    # reads
+    def sites(self, limit=100, offset=0):
+        self.flush()
+        rows = self._connect().execute(
+            "SELECT site, runs, first_ts, last_ts, last_score, last_response_time FROM sites "
+            "WHERE runs > 0 ORDER BY last_ts DESC LIMIT ? OFFSET ?", (limit, offset)).fetchall()
+        return [{"site": site, "runs": runs, "first_run": first_ts / 1000, "last_run": last_ts / 1000,
+                 "last_score": score, "last_response_time": _round(response_time)}
+                for site, runs, first_ts, last_ts, score, response_time in rows]
+
+    def _runs(self, site, since_ms, until_ms):
+        conn = self._connect()
+        row = conn.execute("SELECT id FROM sites WHERE site = ?", (normalize_url(site),)).fetchone()
+        if row is None:
+            return []
+        return conn.execute(
+            "SELECT ts, score, response_time, ttfb, page_bytes FROM runs "
+            "WHERE site_id = ? AND ts >= ? AND ts < ? ORDER BY ts", (row[0], since_ms, until_ms)).fetchall()
+
+    def series(self, site, days=90, window=7, bucket='day', until=None):
+        """Time series for one site over the last ``days`` days.
+
+        With bucket="day" runs are grouped per UTC day (median response time
+        and TTFB, mean score). Each point also carries the rolling median of
+        response time over the trailing ``window`` days (or runs, with
+        bucket="run").
+        """
+        self.flush()
+        until_ms = int((until or time.time()) * 1000)
+        runs = self._runs(site, until_ms - int(days * DAY_MS), until_ms + 1)
+
+        points = []
+        if bucket == 'run':
+            trailing = deque(maxlen=max(1, window))
+            for ts, score, response_time, ttfb, page_bytes in runs:
+                trailing.append(response_time)
+                points.append({"t": ts / 1000, "runs": 1, "score": score, "response_time": _round(response_time),
+                               "ttfb": _round(ttfb), "page_bytes": page_bytes,
+                               "rolling_median_response_time": _round(_median(list(trailing)))})
+        else:
+            days_seen = {}
+            for ts, score, response_time, ttfb, page_bytes in runs:
+                days_seen.setdefault(ts // DAY_MS, []).append((score, response_time, ttfb, page_bytes))
+            trailing = deque()  # (day, response times) within the window
+            for day in sorted(days_seen):
+                values = days_seen[day]
+                trailing.append((day, [v[1] for v in values if v[1] is not None]))
+                while trailing[0][0] <= day - window:
+                    trailing.popleft()
+                ttfbs = [v[2] for v in values if v[2] is not None]
+                sizes = [v[3] for v in values if v[3] is not None]
+                points.append({
+                    "t": day * 86400,
+                    "runs": len(values),
+                    "score": _round(sum(v[0] for v in values) / len(values), 1),
+                    "response_time": _round(_median([v[1] for v in values if v[1] is not None])),
+                    "ttfb": _round(_median(ttfbs)),
+                    "page_bytes": int(_median(sizes)) if sizes else None,
+                    "rolling_median_response_time": _round(_median([rt for _, times in trailing for rt in times])),
+                })
+        return {"site": normalize_url(site), "days": days, "bucket": bucket, "window": window,
+                "points": points, "aggregates": self._aggregates(runs, window)}
+
+    @staticmethod
+    def _aggregates(runs, window):
+        if not runs:
+            return {"runs": 0}
+        times = [r[2] for r in runs if r[2] is not None]
+        scores = [r[1] for r in runs if r[1] is not None]
+        last_ts = runs[-1][0]
+        recent = [r[2] for r in runs if r[2] is not None and r[0] > last_ts - window * DAY_MS]
+        previous = [r[2] for r in runs if r[2] is not None and last_ts - 2 * window * DAY_MS < r[0] <= last_ts - window * DAY_MS]
+        change = None
+        if recent and previous and _median(previous):
+            change = round((_median(recent) - _median(previous)) / _median(previous) * 100, 1)
+        return {
+            "runs": len(runs),
+            "first_run": runs[0][0] / 1000,
+            "last_run": last_ts / 1000,
+            "score_mean": _round(sum(scores) / len(scores), 1) if scores else None,
+            "score_min": min(scores) if scores else None,
+            "score_max": max(scores) if scores else None,
+            "response_time_p50": _round(_median(times)),
+            "response_time_p90": _round(percentile(times, 90)) if times else None,
+            # Median of the last window vs the window before it
+            "response_time_change_pct": change,
+        }
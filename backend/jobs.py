@@ -0,0 +1,499 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+from metrics import Counter
+
+# Job queue configuration (overridable through the environment)
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 4))
+JOB_QUEUE_SIZE = int(os.environ.get('JOB_QUEUE_SIZE', 50))
+JOB_RESULT_TTL = int(os.environ.get('JOB_RESULT_TTL', 3600))
+# "sqlite" keeps queued jobs on disk so they survive restarts; "memory" doesn't
+JOB_BACKEND = os.environ.get('JOB_BACKEND', 'sqlite').lower()
+JOB_DB_PATH = os.environ.get('JOB_DB_PATH', os.path.join(os.path.dirname(__file__), 'jobs.sqlite3'))
+# A running job whose worker hasn't reported for this long is handed to another worker
+JOB_VISIBILITY_TIMEOUT = float(os.environ.get('JOB_VISIBILITY_TIMEOUT', 300))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+# Retry n waits JOB_RETRY_BACKOFF * 2**(n-1) seconds
+JOB_RETRY_BACKOFF = float(os.environ.get('JOB_RETRY_BACKOFF', 30))
+# How often idle workers look for jobs queued by other processes
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 1.0))
+
+job_retries = Counter('webanalyzer_job_retries_total', 'Failed jobs scheduled to run again', ['kind'])
+jobs_dead = Counter('webanalyzer_jobs_dead_lettered_total', 'Jobs moved to the dead-letter table', ['kind'])
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    """Status record for one queued unit of work"""
+
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = 'queued'
+        self.stage = None
+        self.progress = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def set_stage(self, stage):
+        self.stage = stage
+        print(f"Job {self.id}: {stage}")
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    """Bounded FIFO of jobs served by a fixed pool of worker threads.
+
+    submit() never blocks: once ``max_queued`` jobs are waiting it raises
+    QueueFull so the caller can push back on the client. Finished jobs are
+    kept for ``result_ttl`` seconds so their status can be polled.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, max_queued=JOB_QUEUE_SIZE, result_ttl=JOB_RESULT_TTL):
+        self.workers = workers
+        self.result_ttl = result_ttl
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        self._tasks = {}
+        self._mean_duration = None  # moving average of job run time, seconds
+
+    def register(self, kind, fn):
+        """Name ``fn`` as the function run for jobs of ``kind``"""
+        self._tasks[kind] = fn
+
+    def start(self):
+        self._ensure_workers()
+
+    def _ensure_workers(self):
+        # Started lazily so that gunicorn forks before any threads exist
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, kind, fn, *args, **kwargs):
+        """Queue fn(job, *args, **kwargs); its return value becomes job.result"""
+        self._ensure_workers()
+        self._expire()
+        job = Job(kind)
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait((job, fn, args, kwargs))
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+            raise QueueFull("Job queue is full")
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job.to_dict() if job else None
+
+    def is_active(self, job_id):
+        """True while the job is queued or running"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job is not None and job.status in ('queued', 'running')
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def wait_estimate(self):
+        """Rough seconds until a job submitted now would start, for Retry-After"""
+        per_job = self._mean_duration if self._mean_duration is not None else 30.0
+        return (self.depth() + 1) * per_job / self.workers
+
+    def running(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.status == 'running')
+
+    def _work(self):
+        while True:
+            job, fn, args, kwargs = self._queue.get()
+            job.status = 'running'
+            job.started_at = time.time()
+            try:
+                job.result = fn(job, *args, **kwargs)
+                job.status = 'done'
+            except Exception as e:
+                print(f"Job {job.id} failed: {str(e)}")
+                job.error = str(e)
+                job.status = 'failed'
+            finally:
+                job.finished_at = time.time()
+                duration = job.finished_at - job.started_at
+                self._mean_duration = (duration if self._mean_duration is None
+                                       else 0.8 * self._mean_duration + 0.2 * duration)
+                self._queue.task_done()
+
+    def _expire(self):
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.finished_at is not None and job.finished_at < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+
+class DurableJob:
+    """A claimed job of a DurableQueue, handed to the job function.
+
+    Offers the same attributes job functions use on Job. Stage, progress and
+    interim results are written through to the database, where pollers in
+    any process read them, and every update renews the worker's lease.
+    """
+
+    def __init__(self, jobs, job_id, kind, lease):
+        self._jobs = jobs
+        self.id = job_id
+        self.kind = kind
+        self.lease = lease
+        self._result = None
+        self._progress = None
+
+    def set_stage(self, stage):
+        self._jobs._update(self, stage=stage)
+        print(f"Job {self.id}: {stage}")
+
+    @property
+    def result(self):
+        return self._result
+
+    @result.setter
+    def result(self, result):
+        self._result = result
+        self._jobs._update(self, result=json.dumps(result))
+
+    @property
+    def progress(self):
+        return self._progress
+
+    @progress.setter
+    def progress(self, progress):
+        self._progress = progress
+        self._jobs._update(self, progress=json.dumps(progress))
+
+
+class DurableQueue:
+    """Job queue kept in a SQLite database (WAL mode), safe across processes.
+
+    Jobs are rows; a worker claims one by taking a lease on it, which it
+    renews as the job reports progress. If the worker dies (a recycled
+    gunicorn worker, a deploy) the lease runs out after
+    JOB_VISIBILITY_TIMEOUT and another worker picks the job up, so every
+    job runs at least once. A job that raises is retried with exponential
+    backoff; after ``max_attempts``, or straight away if ``is_permanent(e)``
+    says a retry can't help, it is marked failed and copied to the
+    dead_jobs table for inspection.
+
+    Any number of processes on one machine can consume the same file:
+    the web process through its own worker threads and/or separate
+    ``worker.py`` processes. Job functions are looked up by kind, so each
+    kind must be register()ed in every process, and their arguments,
+    results and progress must be JSON-serializable.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, max_queued=JOB_QUEUE_SIZE, result_ttl=JOB_RESULT_TTL,
+                 path=JOB_DB_PATH, visibility_timeout=JOB_VISIBILITY_TIMEOUT, max_attempts=JOB_MAX_ATTEMPTS,
+                 retry_backoff=JOB_RETRY_BACKOFF, is_permanent=None):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max(1, max_attempts)
+        self.retry_backoff = retry_backoff
+        # Decides which exceptions are worth retrying; those it flags fail on the first attempt
+        self.is_permanent = is_permanent
+        self._local = threading.local()
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                stage TEXT,
+                progress TEXT,
+                result TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                available_at REAL NOT NULL,
+                lease TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            )
+        """)
+        # Queued: when the job may (next) run. Running: when its lease expires
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_available ON jobs (status, available_at)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS dead_jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                error TEXT,
+                created_at REAL NOT NULL,
+                failed_at REAL NOT NULL
+            )
+        """)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit; claims take the write lock explicitly with BEGIN IMMEDIATE
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def register(self, kind, fn):
+        """Name ``fn`` as the function run for jobs of ``kind``"""
+        self._tasks[kind] = fn
+
+    # producers
+    def submit(self, kind, fn, *args, **kwargs):
+        """Queue fn(job, *args, **kwargs); fn must be the function registered for ``kind``"""
+        if self._tasks.get(kind) is not fn:
+            raise ValueError(f"Job kind {kind!r} is not registered with this function")
+        self._ensure_workers()
+        self._expire()
+        job_id = uuid.uuid4().hex
+        payload = json.dumps([args, kwargs])
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            queued = conn.execute("SELECT count(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= self.max_queued:
+                raise QueueFull("Job queue is full")
+            conn.execute("INSERT INTO jobs (id, kind, payload, status, max_attempts, available_at, created_at) "
+                         "VALUES (?, ?, ?, 'queued', ?, ?, ?)", (job_id, kind, payload, self.max_attempts, now, now))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._wakeup.set()
+        return DurableJob(self, job_id, kind, None)
+
+    def get(self, job_id):
+        row = self._connect().execute(
+            "SELECT id, kind, status, stage, progress, created_at, started_at, finished_at, result, error, attempts "
+            "FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        keys = ('job_id', 'kind', 'status', 'stage', 'progress', 'created_at', 'started_at', 'finished_at',
+                'result', 'error', 'attempts')
+        job = dict(zip(keys, row))
+        for key in ('progress', 'result'):
+            job[key] = json.loads(job[key]) if job[key] is not None else None
+        return job
+
+    def is_active(self, job_id):
+        """True while the job is queued, running or waiting for a retry"""
+        row = self._connect().execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row is not None and row[0] in ('queued', 'running')
+
+    def depth(self):
+        return self._connect().execute("SELECT count(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def running(self):
+        return self._connect().execute("SELECT count(*) FROM jobs WHERE status = 'running' AND available_at > ?",
+                                       (time.time(),)).fetchone()[0]
+
+    def wait_estimate(self):
+        """Rough seconds until a job submitted now would start, for Retry-After"""
+        mean = self._connect().execute(
+            "SELECT avg(finished_at - started_at) FROM (SELECT started_at, finished_at FROM jobs "
+            "WHERE status = 'done' ORDER BY finished_at DESC LIMIT 20)").fetchone()[0]
+        per_job = mean if mean is not None else 30.0
+        # Workers in other processes aren't known here; assume this process's
+        return (self.depth() + 1) * per_job / max(1, self.workers)
+
+    def dead_letters(self, limit=100):
+        rows = self._connect().execute(
+            "SELECT id, kind, payload, attempts, error, created_at, failed_at FROM dead_jobs "
+            "ORDER BY failed_at DESC LIMIT ?", (limit,)).fetchall()
+        keys = ('job_id', 'kind', 'payload', 'attempts', 'error', 'created_at', 'failed_at')
+        return [dict(zip(keys, row)) for row in rows]
+
+    # consumers
+    def start(self, workers=None):
+        """Start worker threads (JOB_WORKERS by default) consuming this queue"""
+        self._ensure_workers(workers)
+
+    def _ensure_workers(self, workers=None):
+        # Started lazily so that gunicorn forks before any threads exist
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers if workers is None else workers):
+                thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """Let workers finish their current job and exit"""
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def claim(self):
+        """Lease the next job that is due, or return None.
+
+        Returns (DurableJob, fn, args, kwargs). Jobs whose lease expired are
+        claimed again unless they are out of attempts, in which case they
+        are dead-lettered instead.
+        """
+        conn = self._connect()
+        while True:
+            now = time.time()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT id, kind, payload, status, attempts, max_attempts FROM jobs "
+                                   "WHERE status IN ('queued', 'running') AND available_at <= ? "
+                                   "ORDER BY available_at LIMIT 1", (now,)).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                job_id, kind, payload, status, attempts, max_attempts = row
+                if status == 'running' and attempts >= max_attempts:
+                    self._dead_letter(conn, row, f"Worker lost after {attempts} attempts", now)
+                    conn.execute("COMMIT")
+                    continue
+                lease = uuid.uuid4().hex
+                conn.execute("UPDATE jobs SET status = 'running', lease = ?, attempts = attempts + 1, "
+                             "available_at = ?, started_at = ?, stage = NULL WHERE id = ?",
+                             (lease, now + self.visibility_timeout, now, job_id))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            if status == 'running':
+                print(f"Job {job_id}: lease expired, running it again")
+            args, kwargs = json.loads(payload)
+            return DurableJob(self, job_id, kind, lease), self._tasks.get(kind), args, kwargs
+
+    def _update(self, job, **fields):
+        if job.lease is None:
+            return
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        self._connect().execute(f"UPDATE jobs SET {assignments}, available_at = ? WHERE id = ? AND lease = ?",
+                                (*fields.values(), time.time() + self.visibility_timeout, job.id, job.lease))
+
+    def _finish(self, job, result):
+        updated = self._connect().execute(
+            "UPDATE jobs SET status = 'done', result = ?, lease = NULL, finished_at = ? WHERE id = ? AND lease = ?",
+            (json.dumps(result), time.time(), job.id, job.lease)).rowcount
+        if not updated:
+            print(f"Job {job.id} finished after its lease was taken over")
+
+    def _fail(self, job, error, permanent=False):
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT id, kind, payload, status, attempts, max_attempts FROM jobs "
+                               "WHERE id = ? AND lease = ?", (job.id, job.lease)).fetchone()
+            if row is None:
+                print(f"Job {job.id} failed after its lease was taken over")
+            elif permanent or row[4] >= row[5]:
+                self._dead_letter(conn, row, error, now)
+            else:
+                delay = self.retry_backoff * 2 ** (row[4] - 1)
+                conn.execute("UPDATE jobs SET status = 'queued', error = ?, lease = NULL, available_at = ? "
+                             "WHERE id = ?", (error, now + delay, job.id))
+                job_retries.inc(kind=job.kind)
+                print(f"Job {job.id}: retrying in {delay:.0f}s (attempt {row[4]} of {row[5]} failed)")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _dead_letter(conn, row, error, now):
+        job_id, kind, payload, _, attempts, _ = row
+        conn.execute("UPDATE jobs SET status = 'failed', error = ?, lease = NULL, finished_at = ? WHERE id = ?",
+                     (error, now, job_id))
+        conn.execute("INSERT OR REPLACE INTO dead_jobs (id, kind, payload, attempts, error, created_at, failed_at) "
+                     "SELECT id, kind, payload, attempts, error, created_at, ? FROM jobs WHERE id = ?", (now, job_id))
+        jobs_dead.inc(kind=kind)
+        print(f"Job {job_id} failed permanently after {attempts} attempt{'s' if attempts != 1 else ''}: {error}")
+
+    def _work(self):
+        while not self._stopping.is_set():
+            try:
+                claimed = self.claim()
+            except sqlite3.Error as e:
+                print(f"Job queue error: {str(e)}")
+                claimed = None
+            if claimed is None:
+                self._wakeup.wait(JOB_POLL_INTERVAL)
+                self._wakeup.clear()
+                continue
+            job, fn, args, kwargs = claimed
+            if fn is None:
+                self._fail(job, f"No function registered for job kind {job.kind!r}")
+                continue
+            try:
+                result = fn(job, *args, **kwargs)
+            except Exception as e:
+                print(f"Job {job.id} failed: {str(e)}")
+                self._fail(job, str(e), permanent=bool(self.is_permanent and self.is_permanent(e)))
+            else:
+                self._finish(job, result)
+
+    def _expire(self):
+        self._connect().execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+                                (time.time() - self.result_ttl,))
+
+
+def make_job_queue(is_permanent=None):
+    """Build the job queue selected by JOB_BACKEND; ``is_permanent`` is used by the durable queue"""
+    if JOB_BACKEND == 'memory':
+        return JobQueue()
+    return DurableQueue(is_permanent=is_permanent)
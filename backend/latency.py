@@ -0,0 +1,113 @@
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from fetcher import fetch_page
+
+# Latency sampling (overridable through the environment). The analysis fetch
+# counts as the first sample; LATENCY_SAMPLES - 1 more requests are made.
+# One by default, so an analysis downloads the page once; requests ask for
+# more with "samples"
+LATENCY_SAMPLES = int(os.environ.get('LATENCY_SAMPLES', 1))
+LATENCY_CONCURRENCY = int(os.environ.get('LATENCY_CONCURRENCY', 1))
+LATENCY_MAX_SAMPLES = int(os.environ.get('LATENCY_MAX_SAMPLES', 50))
+
+
+def percentile(values, pct):
+    """Linear-interpolated percentile (numpy's default method)"""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    rank = (len(ordered) - 1) * pct / 100
+    low = math.floor(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def distribution(values):
+    if not values:
+        return None
+    mean = sum(values) / len(values)
+    return {
+        "min": round(min(values), 2),
+        "p50": round(percentile(values, 50), 2),
+        "p90": round(percentile(values, 90), 2),
+        "p99": round(percentile(values, 99), 2),
+        "max": round(max(values), 2),
+        "mean": round(mean, 2),
+        "stdev": round(math.sqrt(sum((v - mean) ** 2 for v in values) / len(values)), 2),
+    }
+
+
+def jitter(values):
+    """Mean absolute difference between consecutive samples, in the samples' order"""
+    if len(values) < 2:
+        return 0.0
+    return round(sum(abs(b - a) for a, b in zip(values, values[1:])) / (len(values) - 1), 2)
+
+
+def _sample(url, count):
+    # Runs on one thread, so every request after the first reuses that
+    # thread's keep-alive connection
+    results = []
+    for _ in range(count):
+        try:
+            page = fetch_page(url)
+            results.append(page['timings'])
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def sample_count(samples=None):
+    """Samples actually taken for a requested count (None: LATENCY_SAMPLES)"""
+    return max(1, min(LATENCY_SAMPLES if samples is None else samples, LATENCY_MAX_SAMPLES))
+
+
+def sample_latency(url, first_page, samples=None, concurrency=None):
+    """Time ``samples`` fetches of ``url`` and summarize them.
+
+    ``first_page`` is the fetch already made for the analysis and is reused
+    as a sample. The rest are spread over ``concurrency`` threads, each
+    with its own keep-alive session. Samples that opened a new connection
+    are "cold" and the others are "warm", so handshake cost and steady-state
+    server time are reported separately. All durations are in milliseconds.
+    """
+    samples = sample_count(samples)
+    concurrency = max(1, min(LATENCY_CONCURRENCY if concurrency is None else concurrency, samples - 1 or 1))
+
+    timings = [first_page['timings']]
+    errors = 0
+    extra = samples - 1
+    if extra:
+        if concurrency == 1:
+            # On the calling thread, so the analysis fetch's connection is reused
+            batches = [_sample(url, extra)]
+        else:
+            shares = [extra // concurrency + (1 if i < extra % concurrency else 0) for i in range(concurrency)]
+            with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='latency') as pool:
+                batches = list(pool.map(lambda count: _sample(url, count), [s for s in shares if s]))
+        for results in batches:
+            for result in results:
+                if isinstance(result, Exception):
+                    errors += 1
+                else:
+                    timings.append(result)
+
+    cold = [t for t in timings if t['new_connections']]
+    warm = [t for t in timings if not t['new_connections']]
+    return {
+        "samples": len(timings),
+        "errors": errors,
+        "concurrency": concurrency,
+        "cold_samples": len(cold),
+        "warm_samples": len(warm),
+        "ttfb": distribution([t['ttfb'] for t in timings]),
+        "download": distribution([t['download'] for t in timings]),
+        "total": distribution([t['total'] for t in timings]),
+        "cold_total": distribution([t['total'] for t in cold]),
+        "warm_total": distribution([t['total'] for t in warm]),
+        "warm_ttfb": distribution([t['ttfb'] for t in warm]),
+        "connection_setup": distribution([t['dns'] + t['connect'] + t['tls'] for t in cold]),
+        "jitter": jitter([t['total'] for t in (warm or timings)]),
+    }
@@ -0,0 +1,222 @@
+"""Outgoing email dispatch.
+
+Messages are queued and sent by a few sender threads, each of which keeps
+one authenticated SMTP connection open between messages. A burst of emails
+therefore pays for one TLS handshake and login per sender thread rather than
+one per message. Connections are reopened when the server drops them and
+transient failures are retried with exponential backoff.
+
+EMAIL_BACKEND selects where mail goes: "smtp" (default), "console" (print
+instead of sending) or "null" (drop). The smtp backend needs SMTP_USER and
+SMTP_PASSWORD, and falls back to the console without them unless SMTP_HOST
+is set (an unauthenticated relay). To capture mail locally, point the
+smtp backend at a debugging server, e.g.
+
+    python -m aiosmtpd -n -l localhost:1025
+    SMTP_HOST=localhost SMTP_PORT=1025 SMTP_SSL=0 SMTP_USER= python app.py
+"""
+import os
+import queue
+import smtplib
+import threading
+import time
+from concurrent.futures import Future
+
+from metrics import track
+
+# Email configuration (overridable through the environment)
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'smtp').lower()
+SMTP_HOST = os.environ.get('SMTP_HOST', 'smtp.gmail.com')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', 465))
+SMTP_SSL = os.environ.get('SMTP_SSL', '1').lower() in ('1', 'true', 'yes')
+SMTP_STARTTLS = os.environ.get('SMTP_STARTTLS', '0').lower() in ('1', 'true', 'yes')
+# No default credentials; without them (and without an explicit SMTP_HOST,
+# e.g. a local debugging server) mail goes to the console instead
+SMTP_USER = os.environ.get('SMTP_USER', '')
+SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD', '')
+SMTP_FROM = os.environ.get('SMTP_FROM') or SMTP_USER or 'webanalyzer@localhost'
+SMTP_TIMEOUT = float(os.environ.get('SMTP_TIMEOUT', 10))
+SMTP_CONNECTIONS = int(os.environ.get('SMTP_CONNECTIONS', 2))
+SMTP_RETRIES = int(os.environ.get('SMTP_RETRIES', 3))
+SMTP_BACKOFF = float(os.environ.get('SMTP_BACKOFF', 1.0))
+# Close a connection after this many idle seconds rather than let the server time it out
+SMTP_IDLE_TIMEOUT = float(os.environ.get('SMTP_IDLE_TIMEOUT', 60))
+EMAIL_QUEUE_SIZE = int(os.environ.get('EMAIL_QUEUE_SIZE', 500))
+
+
+class QueueFull(Exception):
+    pass
+
+
+def _transient(error):
+    """True for failures worth retrying on a fresh connection"""
+    if isinstance(error, (smtplib.SMTPAuthenticationError, smtplib.SMTPRecipientsRefused,
+                          smtplib.SMTPSenderRefused)):
+        return False
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    # Disconnects, connect errors, timeouts and other socket errors
+    return isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError))
+
+
+class SMTPConnection:
+    """One lazily opened, reusable, authenticated SMTP session"""
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, use_ssl=SMTP_SSL, starttls=SMTP_STARTTLS,
+                 user=SMTP_USER, password=SMTP_PASSWORD, timeout=SMTP_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.starttls = starttls
+        self.user = user
+        self.password = password
+        self.timeout = timeout
+        self.server = None
+
+    def open(self):
+        if self.server is not None:
+            return self.server
+        cls = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+        server = cls(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls and not self.use_ssl:
+                server.starttls()
+            if self.user:
+                server.login(self.user, self.password)
+        except Exception:
+            server.close()
+            raise
+        self.server = server
+        print(f"SMTP connection opened to {self.host}:{self.port}")
+        return server
+
+    def send(self, msg):
+        self.open().send_message(msg)
+
+    def close(self):
+        if self.server is None:
+            return
+        try:
+            self.server.quit()
+        except Exception:
+            self.server.close()
+        self.server = None
+
+
+class SMTPDispatcher:
+    """Bounded queue of messages drained by ``connections`` sender threads"""
+
+    def __init__(self, connections=SMTP_CONNECTIONS, retries=SMTP_RETRIES, backoff=SMTP_BACKOFF,
+                 idle_timeout=SMTP_IDLE_TIMEOUT, max_queued=EMAIL_QUEUE_SIZE, connection_factory=SMTPConnection):
+        self.connections = max(1, connections)
+        self.retries = retries
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self.connection_factory = connection_factory
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._lock = threading.Lock()
+        self._threads = []
+        self._senders = []
+
+    def _ensure_workers(self):
+        # Started lazily so that gunicorn forks before any threads exist
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.connections):
+                connection = self.connection_factory()
+                thread = threading.Thread(target=self._work, args=(connection,), name=f"smtp-sender-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+                self._senders.append(connection)
+
+    def send(self, msg):
+        """Queue a message; the returned Future resolves once it is accepted by the server"""
+        self._ensure_workers()
+        future = Future()
+        try:
+            self._queue.put_nowait((msg, future))
+        except queue.Full:
+            raise QueueFull("Email queue is full")
+        return future
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def _deliver(self, connection, msg):
+        attempt = 0
+        while True:
+            try:
+                with track('smtp'):
+                    connection.send(msg)
+                return
+            except Exception as e:
+                connection.close()
+                if attempt >= self.retries or not _transient(e):
+                    raise
+                # The first failure is usually a connection the server closed
+                # while idle, so reconnect straight away before backing off
+                delay = self.backoff * (2 ** (attempt - 1)) if attempt else 0
+                attempt += 1
+                print(f"SMTP send failed ({str(e)}), retry {attempt}/{self.retries} in {delay:.1f}s")
+                time.sleep(delay)
+
+    def _work(self, connection):
+        while True:
+            try:
+                msg, future = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                connection.close()
+                continue
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                self._deliver(connection, msg)
+                future.set_result(True)
+            except Exception as e:
+                future.set_exception(e)
+
+    def close(self):
+        for connection in self._senders:
+            connection.close()
+
+
+class ConsoleDispatcher:
+    """Prints messages instead of sending them (local development)"""
+
+    def send(self, msg):
+        attachments = [part.get_filename() for part in msg.iter_attachments()] if msg.is_multipart() else []
+        body = msg.get_body(preferencelist=('plain',))
+        print(f"--- Email to {msg['To']}: {msg['Subject']} ---")
+        print(body.get_content() if body is not None else '')
+        if attachments:
+            print(f"--- Attachments: {', '.join(attachments)} ---")
+        future = Future()
+        future.set_result(True)
+        return future
+
+    def depth(self):
+        return 0
+
+    def close(self):
+        pass
+
+
+class NullDispatcher(ConsoleDispatcher):
+    """Drops every message"""
+
+    def send(self, msg):
+        future = Future()
+        future.set_result(True)
+        return future
+
+
+def make_dispatcher():
+    if EMAIL_BACKEND == 'console':
+        return ConsoleDispatcher()
+    if EMAIL_BACKEND in ('null', 'none'):
+        return NullDispatcher()
+    if not (SMTP_USER and SMTP_PASSWORD) and 'SMTP_HOST' not in os.environ:
+        print("WARNING: SMTP_USER/SMTP_PASSWORD are not set; emails will be printed to the console, not sent")
+        return ConsoleDispatcher()
+    return SMTPDispatcher()
@@ -0,0 +1,207 @@
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urljoin, urlsplit
+
+from fetcher import FETCH_CHUNK_SIZE, get_session, host_slot, normalize_url
+from metrics import track
+
+# "deep" makes /analyze measure subresources unless the request says otherwise
+PERFORMANCE_MODE = os.environ.get('PERFORMANCE_MODE', 'basic').lower()
+
+# Deep performance mode limits (overridable through the environment)
+PAGE_WEIGHT_MAX_RESOURCES = int(os.environ.get('PAGE_WEIGHT_MAX_RESOURCES', 150))
+PAGE_WEIGHT_CONCURRENCY = int(os.environ.get('PAGE_WEIGHT_CONCURRENCY', 8))
+PAGE_WEIGHT_TIMEOUT = float(os.environ.get('PAGE_WEIGHT_TIMEOUT', 5))          # per request
+PAGE_WEIGHT_TIME_BUDGET = float(os.environ.get('PAGE_WEIGHT_TIME_BUDGET', 20))  # whole page
+PAGE_WEIGHT_MAX_BYTES = int(os.environ.get('PAGE_WEIGHT_MAX_BYTES', 25 * 1024 * 1024))  # body bytes downloaded
+
+# Shared by every deep analysis, so PAGE_WEIGHT_CONCURRENCY is a process-wide
+# cap and its threads keep their keep-alive sessions between pages
+_page_weight_executor = ThreadPoolExecutor(max_workers=max(1, PAGE_WEIGHT_CONCURRENCY),
+                                           thread_name_prefix='page-weight')
+
+# Text formats that should be served compressed
+_COMPRESSIBLE = ('text/', 'javascript', 'json', 'xml', 'svg')
+_COMPRESSED_ENCODINGS = ('gzip', 'br', 'deflate', 'zstd')
+
+
+def _is_compressible(resource_type, content_type):
+    if resource_type in ('script', 'stylesheet', 'document'):
+        return True
+    return any(marker in (content_type or '').lower() for marker in _COMPRESSIBLE)
+
+
+def _is_cacheable(headers):
+    cache_control = (headers.get('Cache-Control') or '').lower()
+    if 'no-store' in cache_control or 'no-cache' in cache_control:
+        return False
+    for directive in cache_control.split(','):
+        name, _, value = directive.strip().partition('=')
+        if name in ('max-age', 's-maxage') and value.strip().isdigit():
+            return int(value) > 0
+    return bool(headers.get('Expires'))
+
+
+class _ByteBudget:
+    """Body bytes the whole page may still download, shared by its fetch threads"""
+
+    def __init__(self, limit):
+        self.remaining = limit
+        self._lock = threading.Lock()
+
+    def take(self, amount):
+        with self._lock:
+            if self.remaining < amount:
+                self.remaining = 0
+                return False
+            self.remaining -= amount
+            return True
+
+
+def _measure(url, budget, deadline):
+    """Size one resource: HEAD first, then a streamed GET when no length is declared.
+
+    Returns (status, transfer bytes, response headers, exhausted)
+    where ``exhausted`` means the byte or time budget ran out mid-body.
+    """
+    session = get_session()
+    timeout = max(0.5, min(PAGE_WEIGHT_TIMEOUT, deadline - time.monotonic()))
+    with host_slot(urlsplit(url).hostname or '', timeout=timeout):
+        response = session.head(url, timeout=timeout, allow_redirects=True)
+        response.close()
+        declared = response.headers.get('Content-Length')
+        if response.status_code < 400 and declared and declared.isdigit():
+            return response.status_code, int(declared), response.headers, False
+
+        # HEAD not supported or no Content-Length: count the bytes on the wire
+        response = session.get(url, timeout=timeout, stream=True)
+        try:
+            size = 0
+            for chunk in response.raw.stream(FETCH_CHUNK_SIZE, decode_content=False):
+                if not budget.take(len(chunk)) or time.monotonic() > deadline:
+                    return response.status_code, size, response.headers, True
+                size += len(chunk)
+            return response.status_code, size, response.headers, False
+        finally:
+            response.close()
+
+
+def analyze_page_weight(page, resources, base_href=None):
+    """Fetch a page's subresources concurrently and total up what it costs to load.
+
+    ``resources`` comes from extract_seo(..., collect_resources=True). At most
+    PAGE_WEIGHT_MAX_RESOURCES are measured, PAGE_WEIGHT_CONCURRENCY at a time;
+    whatever hasn't finished after PAGE_WEIGHT_TIME_BUDGET seconds or once
+    PAGE_WEIGHT_MAX_BYTES have been downloaded is reported as not measured.
+    """
+    started = time.monotonic()
+    deadline = started + PAGE_WEIGHT_TIME_BUDGET
+    base = urljoin(page['final_url'], base_href) if base_href else page['final_url']
+
+    unique = {}
+    for resource in resources:
+        url = urljoin(base, resource['url'].strip())
+        if urlsplit(url).scheme not in ('http', 'https'):
+            continue  # data: URIs and the like are already inside the document
+        key = normalize_url(url)
+        if key in unique:
+            unique[key]['blocking'] = unique[key]['blocking'] or resource['blocking']
+        else:
+            unique[key] = {"url": url, "type": resource['type'], "blocking": resource['blocking']}
+    discovered = list(unique.values())
+    # Critical-path resources first, so they are measured even if the budget runs out
+    discovered.sort(key=lambda r: not r['blocking'])
+    selected = discovered[:PAGE_WEIGHT_MAX_RESOURCES]
+
+    document_bytes = page['headers'].get('Content-Length')
+    document_bytes = int(document_bytes) if document_bytes and document_bytes.isdigit() else len(page['content'])
+    document_compressed = (page['headers'].get('Content-Encoding') or '').lower() in _COMPRESSED_ENCODINGS
+    summary = {
+        "document_bytes": document_bytes,
+        "total_bytes": document_bytes,
+        "critical_path_bytes": document_bytes,
+        "requests": 1,
+        "resources_discovered": len(discovered),
+        "resources_measured": 0,
+        "resources_failed": 0,
+        "resources_not_measured": len(discovered) - len(selected),
+        "by_type": {},
+        "compressible": 1,
+        "compressed": int(document_compressed),
+        "cacheable": 0,
+        "blocking_resources": 0,
+        "largest": [],
+        "truncated": len(selected) < len(discovered),
+    }
+
+    budget = _ByteBudget(PAGE_WEIGHT_MAX_BYTES)
+    pending = {_page_weight_executor.submit(_measure, r['url'], budget, deadline): r for r in selected}
+    try:
+        with track('page_weight'):
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    resource = pending.pop(future)
+                    try:
+                        status, size, headers, exhausted = future.result()
+                    except Exception:
+                        summary["resources_failed"] += 1
+                        continue
+                    if status >= 400:
+                        summary["resources_failed"] += 1
+                        continue
+                    summary["truncated"] = summary["truncated"] or exhausted
+                    _add_resource(summary, resource, size, headers)
+    finally:
+        summary["resources_not_measured"] += len(pending)
+        summary["truncated"] = summary["truncated"] or bool(pending)
+        # Don't wait for stragglers; each is bounded by PAGE_WEIGHT_TIMEOUT
+        for future in pending:
+            future.cancel()
+
+    summary["largest"] = sorted(summary["largest"], key=lambda r: r['bytes'], reverse=True)[:5]
+    summary["elapsed_ms"] = round((time.monotonic() - started) * 1000, 1)
+    return summary
+
+
+def _add_resource(summary, resource, size, headers):
+    summary["resources_measured"] += 1
+    summary["requests"] += 1
+    summary["total_bytes"] += size
+    by_type = summary["by_type"].setdefault(resource['type'], {"count": 0, "bytes": 0})
+    by_type["count"] += 1
+    by_type["bytes"] += size
+    if resource['blocking']:
+        summary["blocking_resources"] += 1
+        summary["critical_path_bytes"] += size
+    if _is_compressible(resource['type'], headers.get('Content-Type')):
+        summary["compressible"] += 1
+        if (headers.get('Content-Encoding') or '').lower() in _COMPRESSED_ENCODINGS:
+            summary["compressed"] += 1
+    if _is_cacheable(headers):
+        summary["cacheable"] += 1
+    summary["largest"].append({"url": resource['url'], "type": resource['type'], "bytes": size})
+    if len(summary["largest"]) > 20:
+        summary["largest"] = sorted(summary["largest"], key=lambda r: r['bytes'], reverse=True)[:5]
+
+
+def page_weight_score(weight):
+    """0-100 score for how heavy the page is to load, independent of server speed"""
+    score = 100.0
+    mb = weight['total_bytes'] / (1024 * 1024)
+    score -= max(0.0, mb - 1.5) * 15                      # beyond ~1.5 MB total
+    score -= max(0, weight['requests'] - 50) * 0.5         # beyond ~50 requests
+    critical_kb = weight['critical_path_bytes'] / 1024
+    score -= max(0.0, critical_kb - 170) / 20              # beyond the ~170 KB first-render budget
+    score -= weight['blocking_resources'] * 2
+    if weight['compressible']:
+        score -= 20 * (1 - weight['compressed'] / weight['compressible'])
+    measured = weight['resources_measured']
+    if measured:
+        score -= 10 * (1 - weight['cacheable'] / measured)
+    return max(0, min(100, int(score)))
@@ -0,0 +1,520 @@
+import io
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import matplotlib
+from matplotlib.figure import Figure
+from PIL import Image as PILImage
+from reportlab import rl_config
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Image
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+
+from recommendations import by_category, generate_recommendations
+from report_index import report_filename
+from scoring import performance_rating, response_time_rating
+
+# PDF and chart rendering. Imported by the render pool's worker processes
+# (see render_pool.py), which keep the report template below between jobs.
+
+# Use non-interactive backend for matplotlib
+matplotlib.use('Agg')
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+LOGO_PATH = os.path.abspath(os.path.join(APP_DIR, '..', 'WebAnalayzer_logo.png'))
+
+# Without reportlab's C accelerators, ASCII85-encoding image streams in pure
+# Python was most of a report's build time; binary streams are also smaller
+rl_config.useA85 = 0
+
+# The logo is drawn at 1 inch square; 300px keeps it sharp at 300 dpi
+LOGO_PIXELS = 300
+
+
+def _load_logo():
+    """The logo downscaled once to its printed size, as PNG bytes (None if missing)"""
+    if not os.path.exists(LOGO_PATH):
+        return None
+    with PILImage.open(LOGO_PATH) as logo:
+        logo = logo.resize((LOGO_PIXELS, LOGO_PIXELS), PILImage.LANCZOS)
+        buffer = io.BytesIO()
+        logo.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def _section_header(title, background):
+    header = Table([[title]], colWidths=[6.34*inch])
+    header.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor(background)),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.whitesmoke),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 12),
+        ('ALIGNMENT', (0, 0), (-1, -1), 'CENTER'),
+        ('TOPPADDING', (0, 0), (-1, -1), 6),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ]))
+    return header
+
+
+def _metrics_table_style(header_background, header_text, stripe):
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor(header_background)),
+        ('TEXTCOLOR', (0, 0), (-1, 0), header_text),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('FONTSIZE', (0, 1), (-1, -1), 9),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('LEFTPADDING', (0, 0), (-1, -1), 4),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 4),
+        ('TOPPADDING', (0, 0), (-1, -1), 4),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#000000')),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.HexColor('#ffffff'), colors.HexColor(stripe)])
+    ])
+
+
+# Table styles are only read when a table is laid out, so one set serves every report
+INFO_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f5f5f5')),
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+    ('LEFTPADDING', (0, 0), (-1, -1), 6),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 6),
+    ('TOPPADDING', (0, 0), (-1, -1), 4),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cccccc')),
+])
+SEO_TABLE_STYLE = _metrics_table_style('#34a853', colors.whitesmoke, '#f0f7f0')
+PERF_TABLE_STYLE = _metrics_table_style('#fbbc04', colors.HexColor('#000000'), '#fffef0')
+REC_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#5f6368')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 9),
+    ('FONTSIZE', (0, 1), (-1, -1), 8),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+    ('ALIGN', (1, 0), (-1, -1), 'LEFT'),
+    ('LEFTPADDING', (0, 0), (-1, -1), 5),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 5),
+    ('TOPPADDING', (0, 0), (-1, -1), 5),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#cccccc')),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.HexColor('#ffffff'), colors.HexColor('#f9f9f9')])
+])
+
+
+class ReportTemplate:
+    """The parts of a report that are the same for every site.
+
+    Styles, the logo header, the section banners and the footer are built
+    once and the same flowables go into every report; generate_pdf_report
+    only builds the tables and charts that hold the site's data. The logo
+    Image is decoded on first draw and its pixels are reused from then on.
+    Flowables keep layout state while a document is built, so each thread
+    gets its own template (see get_template).
+    """
+
+    def __init__(self, logo):
+        styles = getSampleStyleSheet()
+        self.title_style = ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=20,
+            textColor=colors.HexColor('#ffffff'),
+            spaceAfter=6,
+            spaceBefore=6,
+            alignment=TA_CENTER
+        )
+        self.footer_style = ParagraphStyle(
+            'Footer',
+            parent=styles['Normal'],
+            fontSize=8,
+            textColor=colors.HexColor('#666666'),
+            alignment=TA_CENTER
+        )
+
+        # Header with Logo and Title
+        title = Paragraph("AI Website Analysis Report", self.title_style)
+        row = [title]
+        if logo:
+            try:
+                row = [Image(io.BytesIO(logo), width=1*inch, height=1*inch), title]
+            except Exception as e:
+                print(f"Logo Error: {str(e)}")
+        self.header = Table([row], colWidths=[1.2*inch, 5.3*inch])
+        self.header.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#1a73e8')),
+            ('ALIGN', (0, 0), (0, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ]))
+
+        self.seo_header = _section_header('SEO ANALYSIS', '#1a73e8')
+        self.perf_header = _section_header('PERFORMANCE ANALYSIS', '#ea4335')
+        self.rec_header = _section_header('COMPREHENSIVE RECOMMENDATIONS', '#5f6368')
+        self.footer = Paragraph(
+            "<i>This report was generated by WebAnalyzer AI. Follow these recommendations to improve your website's performance and SEO.</i>",
+            self.footer_style
+        )
+
+
+# Logo bytes are per process; templates are per thread
+_logo = None
+_templates = threading.local()
+
+
+def get_template():
+    global _logo
+    template = getattr(_templates, 'template', None)
+    if template is None:
+        if _logo is None:
+            _logo = _load_logo() or b''
+        template = ReportTemplate(_logo)
+        _templates.template = template
+    return template
+
+
+def init_worker():
+    """Process pool initializer: build the report template and warm up the Agg renderer"""
+    get_template()
+    render_chart(Figure(figsize=(1, 1)))
+    print(f"PDF render worker ready (pid {os.getpid()})")
+
+
+# 5. PDF GENERATION (recommendations come from the rules in recommendations.py)
+def generate_pdf_report(seo, performance, user_email, reports_dir, report_id=None, stage_times=None, trend=None,
+                        charts=None):
+    """Build the PDF and return its path; chart render seconds go into ``stage_times['chart']`` if given.
+    With ``reports_dir`` None nothing is written to disk and the PDF's bytes are returned instead.
+
+    ``trend`` is the site's HistoryStore.series(), drawn as a trend chart when it has two or more points.
+    ``charts`` maps chart names to PNG bytes already drawn for this same analysis (another recipient's
+    report); they are reused as is, and charts drawn here are added to it.
+    """
+    stage_times = {} if stage_times is None else stage_times
+    charts = {} if charts is None else charts
+
+    def chart(name, create, data):
+        if name not in charts:
+            chart_start = time.perf_counter()
+            buffer = create(data)
+            stage_times['chart'] = stage_times.get('chart', 0.0) + time.perf_counter() - chart_start
+            charts[name] = buffer.getvalue() if buffer else None
+        return io.BytesIO(charts[name]) if charts[name] else None
+
+    try:
+        print("Generating PDF report...")
+        
+        if reports_dir is None:
+            # Kept in memory for the caller to stream or store
+            output = pdf_path = io.BytesIO()
+        else:
+            pdf_path = os.path.join(reports_dir, report_filename(user_email, report_id))
+            output = pdf_path
+        
+        # Create PDF with better margins
+        doc = SimpleDocTemplate(output, pagesize=letter,
+                               rightMargin=0.6*inch,
+                               leftMargin=0.6*inch,
+                               topMargin=0.6*inch,
+                               bottomMargin=0.6*inch)
+        
+        elements = []
+        template = get_template()
+        
+        elements.append(template.header)
+        elements.append(Spacer(1, 0.15*inch))
+        
+        # Website Info Section
+        info_data = [
+            ['Website URL:', seo['url']],
+            ['Analysis Date:', datetime.now().strftime('%Y-%m-%d %H:%M:%S')],
+            ['Recipient:', user_email]
+        ]
+        
+        info_table = Table(info_data, colWidths=[1.5*inch, 4.84*inch])
+        info_table.setStyle(INFO_TABLE_STYLE)
+        
+        elements.append(info_table)
+        elements.append(Spacer(1, 0.15*inch))
+        
+        # SEO Analysis Section
+        elements.append(template.seo_header)
+        
+        # SEO Metrics Table - Compact
+        seo_data = [
+            ['Metric', 'Status', 'Recommendation'],
+            ['Title Tag', seo['title'][:30], 'Use descriptive, unique titles'],
+            ['Meta Description', seo['meta_description'], 'Add compelling description (160 chars)'],
+            ['H1 Tags', str(seo['h1_count']), 'Use only 1 H1 per page'],
+            ['Total Images', str(seo['total_images']), 'Optimize image sizes'],
+            ['Images without ALT', str(seo['images_without_alt']), 'Add ALT text to all images'],
+        ]
+        
+        seo_table = Table(seo_data, colWidths=[1.5*inch, 1.5*inch, 3.34*inch])
+        seo_table.setStyle(SEO_TABLE_STYLE)
+        
+        elements.append(seo_table)
+        elements.append(Spacer(1, 0.1*inch))
+        
+        # SEO Chart
+        seo_chart = chart('seo', create_seo_chart, seo)
+        if seo_chart:
+            img = Image(seo_chart, width=6.34*inch, height=2.5*inch)
+            elements.append(img)
+        
+        elements.append(Spacer(1, 0.15*inch))
+        
+        # Performance Analysis Section
+        elements.append(template.perf_header)
+        
+        # Performance Metrics Table - Compact
+        perf_data = [
+            ['Metric', 'Value', 'Status'],
+            ['Performance Score', f"{performance['score']}/100", performance_rating(performance['score'])],
+            ['Response Time', f"{performance['response_time']:.0f}ms", response_time_rating(performance['response_time'])],
+            ['HTTP Status', str(performance['status_code']), 'OK' if performance['status_code'] == 200 else 'Check']
+        ]
+        timings = performance.get('timings')
+        if timings:
+            perf_data.extend([
+                ['DNS Lookup', f"{timings['dns']:.0f}ms", 'Fast' if timings['dns'] < 100 else 'Slow'],
+                ['TCP Connect', f"{timings['connect']:.0f}ms", 'Fast' if timings['connect'] < 200 else 'Slow'],
+                ['TLS Handshake', f"{timings['tls']:.0f}ms", 'Fast' if timings['tls'] < 300 else 'Slow'],
+                ['Time to First Byte', f"{timings['ttfb']:.0f}ms", 'Fast' if timings['ttfb'] < 800 else 'Slow'],
+                ['Download Time', f"{timings['download']:.0f}ms", 'Fast' if timings['download'] < 500 else 'Slow'],
+            ])
+        latency = performance.get('latency')
+        if latency:
+            total = latency['total']
+            perf_data.extend([
+                ['Latency p90 / p99', f"{total['p90']:.0f} / {total['p99']:.0f}ms", 'Fast' if total['p90'] < 1500 else 'Slow'],
+                ['Jitter', f"{latency['jitter']:.0f}ms", 'Stable' if latency['jitter'] < 100 else 'Unstable'],
+                ['Samples (cold / warm)', f"{latency['cold_samples']} / {latency['warm_samples']}",
+                 'OK' if not latency['errors'] else f"{latency['errors']} failed"],
+            ])
+        weight = performance.get('page_weight')
+        if weight:
+            perf_data.extend([
+                ['Page Weight', f"{weight['total_bytes'] / 1024:.0f} KB", 'Good' if weight['total_bytes'] < 1.5 * 1024 * 1024 else 'Heavy'],
+                ['Requests', str(weight['requests']), 'Good' if weight['requests'] <= 50 else 'Many'],
+                ['Critical Path', f"{weight['critical_path_bytes'] / 1024:.0f} KB", 'Good' if weight['critical_path_bytes'] < 170 * 1024 else 'Large'],
+                ['Compressed', f"{weight['compressed']}/{weight['compressible']}", 'OK' if weight['compressed'] == weight['compressible'] else 'Check'],
+                ['Cacheable Assets', f"{weight['cacheable']}/{weight['resources_measured']}", 'OK' if weight['cacheable'] == weight['resources_measured'] else 'Check'],
+            ])
+        
+        perf_table = Table(perf_data, colWidths=[2*inch, 1.5*inch, 2.84*inch])
+        perf_table.setStyle(PERF_TABLE_STYLE)
+        
+        elements.append(perf_table)
+        elements.append(Spacer(1, 0.1*inch))
+        
+        # Performance Chart
+        perf_chart = chart('performance', create_performance_chart, performance)
+        if perf_chart:
+            img = Image(perf_chart, width=6.34*inch, height=3*inch)
+            elements.append(img)
+
+        # Trend over previous runs of the same site
+        if trend and len(trend['points']) >= 2:
+            trend_chart = chart('trend', create_trend_chart, trend)
+            if trend_chart:
+                elements.append(Spacer(1, 0.1*inch))
+                elements.append(Image(trend_chart, width=6.34*inch, height=2.6*inch))
+        
+        elements.append(PageBreak())
+        
+        # Recommendations Section
+        elements.append(template.rec_header)
+        elements.append(Spacer(1, 0.08*inch))
+        
+        # Generate recommendations based on analysis
+        recommendations = generate_recommendations(seo, performance)
+        
+        # Rules carry their category and severity; see recommendations.py
+        rec_rows = [['Category', 'Priority', 'Recommendation']]
+        for category, recs in by_category(recommendations).items():
+            for i, rec in enumerate(recs):
+                rec_rows.append([category if i == 0 else '', rec.severity.capitalize(), f"✓ {rec.text}"])
+        
+        rec_table = Table(rec_rows, colWidths=[1.5*inch, 0.74*inch, 4.1*inch])
+        rec_table.setStyle(REC_TABLE_STYLE)
+        
+        elements.append(rec_table)
+        
+        # Footer
+        elements.append(Spacer(1, 0.2*inch))
+        elements.append(template.footer)
+        
+        # Build PDF
+        doc.build(elements)
+        if reports_dir is None:
+            print(f"PDF report generated in memory ({output.tell()} bytes)")
+            return output.getvalue()
+        print(f"PDF report generated: {pdf_path}")
+        return pdf_path
+        
+    except Exception as e:
+        print(f"PDF Generation Error: {str(e)}")
+        raise Exception(f"PDF generation failed: {str(e)}")
+
+
+# 6. CHART GENERATION FUNCTIONS
+# Charts are rendered to in-memory PNG buffers that reportlab's Image reads directly
+def render_chart(fig):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=100, bbox_inches='tight', facecolor='white')
+    buffer.seek(0)
+    return buffer
+
+def create_seo_chart(seo):
+    try:
+        print("Creating SEO chart...")
+        # Figure API only: no pyplot global state, so concurrent renders can't collide
+        fig = Figure(figsize=(10, 4))
+        ax1, ax2 = fig.subplots(1, 2)
+        fig.patch.set_facecolor('white')
+        
+        # Bar chart for images
+        categories = ['Total Images', 'With ALT', 'Without ALT']
+        values = [seo['total_images'], seo['total_images'] - seo['images_without_alt'], seo['images_without_alt']]
+        colors_list = ['#1a73e8', '#34a853', '#ea4335']
+        
+        ax1.bar(categories, values, color=colors_list)
+        ax1.set_ylabel('Count')
+        ax1.set_title('Image ALT Tag Analysis')
+        ax1.grid(axis='y', alpha=0.3)
+        
+        # Pie chart for meta tags
+        meta_status = [1 if seo['meta_description'] == 'Present' else 0, 1 if seo['meta_description'] == 'Missing' else 0]
+        meta_labels = [seo['meta_description'], 'Not ' + seo['meta_description']]
+        meta_colors = ['#34a853', '#ea4335']
+        
+        if meta_status[0] > 0:
+            ax2.pie([1], labels=['Meta Description Present'], colors=['#34a853'], autopct='%1.0f%%', startangle=90)
+        else:
+            ax2.pie([1], labels=['Meta Description Missing'], colors=['#ea4335'], autopct='%1.0f%%', startangle=90)
+        
+        ax2.set_title('Meta Description Status')
+        
+        fig.tight_layout()
+        
+        return render_chart(fig)
+    except Exception as e:
+        print(f"SEO Chart Error: {str(e)}")
+        return None
+
+def create_performance_chart(performance):
+    try:
+        print("Creating performance chart...")
+        latency = performance.get('latency')
+        fig = Figure(figsize=(11, 5) if latency else (8, 6))
+        if latency:
+            ax, lat_ax = fig.subplots(1, 2, gridspec_kw={'width_ratios': [1, 1.4]})
+        else:
+            ax = fig.subplots()
+        fig.patch.set_facecolor('white')
+        
+        score = performance['score']
+        colors_list = []
+        
+        if score >= 80:
+            colors_list = ['#34a853', '#e8e8e8']
+        elif score >= 60:
+            colors_list = ['#fbbc04', '#e8e8e8']
+        else:
+            colors_list = ['#ea4335', '#e8e8e8']
+        
+        # Create pie chart for performance score
+        sizes = [score, 100 - score]
+        labels = [f'Score: {score}/100', f'Remaining: {100-score}']
+        explode = (0.05, 0)
+        
+        wedges, texts, autotexts = ax.pie(sizes, explode=explode, labels=labels, autopct='%1.1f%%',
+                                           colors=colors_list, shadow=True, startangle=90)
+        
+        ax.set_title(f'Website Performance Score\nResponse Time: {performance["response_time"]:.2f}ms', fontsize=14, fontweight='bold')
+        
+        for autotext in autotexts:
+            autotext.set_color('white')
+            autotext.set_fontweight('bold')
+            autotext.set_fontsize(12)
+
+        if latency:
+            # Percentiles over the repeated samples: TTFB vs full response time
+            percentiles = ['p50', 'p90', 'p99']
+            positions = range(len(percentiles))
+            width = 0.38
+            ttfb = [latency['ttfb'][p] for p in percentiles]
+            total = [latency['total'][p] for p in percentiles]
+            lat_ax.bar([x - width / 2 for x in positions], ttfb, width, label='TTFB', color='#4285f4')
+            lat_ax.bar([x + width / 2 for x in positions], total, width, label='Total', color='#fbbc04')
+            if latency.get('cold_total') and latency.get('warm_total'):
+                lat_ax.axhline(latency['cold_total']['p50'], color='#ea4335', linestyle='--', linewidth=1,
+                               label=f"Cold p50 {latency['cold_total']['p50']:.0f}ms")
+            lat_ax.set_xticks(list(positions))
+            lat_ax.set_xticklabels(percentiles)
+            lat_ax.set_ylabel('Milliseconds', fontsize=11, fontweight='bold')
+            lat_ax.set_title(f"Latency over {latency['samples']} requests\njitter {latency['jitter']:.0f}ms",
+                             fontsize=14, fontweight='bold')
+            lat_ax.legend(fontsize=9)
+            lat_ax.grid(axis='y', alpha=0.3)
+        
+        fig.tight_layout()
+        
+        return render_chart(fig)
+    except Exception as e:
+        print(f"Performance Chart Error: {str(e)}")
+        return None
+
+def create_trend_chart(trend):
+    try:
+        print("Creating trend chart...")
+        points = trend['points']
+        days = [datetime.fromtimestamp(p['t'], tz=timezone.utc) for p in points]
+        fig = Figure(figsize=(11, 4.5))
+        ax = fig.subplots()
+        fig.patch.set_facecolor('white')
+
+        # Daily medians with the rolling median on top; score on its own axis
+        ax.plot(days, [p['response_time'] for p in points], color='#4285f4', marker='o', markersize=3,
+                linewidth=1, alpha=0.6, label='Response time (daily median)')
+        ax.plot(days, [p['rolling_median_response_time'] for p in points], color='#1a73e8', linewidth=2.5,
+                label=f"{trend['window']}-day rolling median")
+        ax.set_ylabel('Milliseconds', fontsize=11, fontweight='bold')
+        ax.set_ylim(bottom=0)
+        ax.grid(alpha=0.3)
+
+        score_ax = ax.twinx()
+        score_ax.plot(days, [p['score'] for p in points], color='#34a853', linestyle='--', linewidth=1.5,
+                      label='Performance score')
+        score_ax.set_ylabel('Score', fontsize=11, fontweight='bold')
+        score_ax.set_ylim(0, 105)
+
+        lines = ax.get_lines() + score_ax.get_lines()
+        ax.legend(lines, [line.get_label() for line in lines], fontsize=9, loc='upper left')
+        fig.autofmt_xdate()
+
+        aggregates = trend['aggregates']
+        change = aggregates.get('response_time_change_pct')
+        subtitle = f"{aggregates['runs']} runs over the last {trend['days']} days"
+        if change is not None:
+            subtitle += f", response time {change:+.1f}% vs previous {trend['window']} days"
+        ax.set_title(f"Response Time Trend\n{subtitle}", fontsize=14, fontweight='bold')
+
+        fig.tight_layout()
+
+        return render_chart(fig)
+    except Exception as e:
+        print(f"Trend Chart Error: {str(e)}")
+        return None
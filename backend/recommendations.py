@@ -0,0 +1,150 @@
+from collections import namedtuple
+
+from scoring import FAIR_SCORE, GOOD_SCORE
+
+# Report categories and severities, in the order the PDF lists them
+CATEGORIES = ('SEO & Content', 'User Experience', 'Performance', 'Technical')
+SEVERITIES = ('critical', 'high', 'medium', 'low')
+
+MB = 1024 * 1024
+
+# A check over one analysis result. ``when(seo, performance)`` decides
+# whether it applies (None: always); ``text`` is a string or a function of
+# (seo, performance). ``requires`` names a performance section the check
+# needs (e.g. "page_weight"); the rule is skipped when it is absent.
+Rule = namedtuple('Rule', 'id category severity when text requires', defaults=(None,))
+
+Recommendation = namedtuple('Recommendation', 'rule category severity text')
+
+
+def _weight(performance):
+    return performance['page_weight']
+
+
+RULES = [
+    # SEO
+    Rule('title-missing', 'SEO & Content', 'critical',
+         lambda seo, perf: seo['title'] == 'Missing',
+         "Add a descriptive title tag (optimal: 50-60 characters)"),
+    Rule('meta-description-missing', 'SEO & Content', 'high',
+         lambda seo, perf: seo['meta_description'] == 'Missing',
+         "Add meta description to home page (recommended 150-160 characters)"),
+    Rule('meta-description-present', 'SEO & Content', 'low',
+         lambda seo, perf: seo['meta_description'] != 'Missing',
+         "Meta description present - ensure it's compelling and keyword-rich"),
+    Rule('h1-multiple', 'SEO & Content', 'medium',
+         lambda seo, perf: seo['h1_count'] > 1,
+         "Use only ONE H1 tag per page for better SEO hierarchy"),
+    Rule('h1-missing', 'SEO & Content', 'high',
+         lambda seo, perf: seo['h1_count'] == 0,
+         "Add an H1 tag to your main pages for better SEO"),
+    Rule('images-without-alt', 'SEO & Content', 'medium',
+         lambda seo, perf: seo['images_without_alt'] > 0,
+         lambda seo, perf: f"Add ALT text to {seo['images_without_alt']} images for accessibility and SEO"),
+
+    # Performance
+    Rule('score-poor', 'Performance', 'high',
+         lambda seo, perf: perf['score'] < FAIR_SCORE,
+         "Website performance is slow - consider image optimization and caching"),
+    Rule('score-fair', 'Performance', 'medium',
+         lambda seo, perf: FAIR_SCORE <= perf['score'] < GOOD_SCORE,
+         "Optimize assets to improve page load speed"),
+    Rule('response-time-critical', 'Performance', 'critical',
+         lambda seo, perf: perf['response_time'] > 3000,
+         "Response time exceeds 3 seconds - implement CDN for faster delivery"),
+    Rule('response-time-slow', 'Performance', 'high',
+         lambda seo, perf: 2000 < perf['response_time'] <= 3000,
+         "Reduce server response time through database optimization and caching"),
+    Rule('page-weight-heavy', 'Performance', 'high',
+         lambda seo, perf: _weight(perf)['total_bytes'] > 3 * MB,
+         lambda seo, perf: f"Page weighs {_weight(perf)['total_bytes'] / MB:.1f} MB - compress images and trim unused scripts",
+         'page_weight'),
+    Rule('render-blocking', 'Performance', 'medium',
+         lambda seo, perf: _weight(perf)['blocking_resources'] > 2,
+         lambda seo, perf: f"{_weight(perf)['blocking_resources']} render-blocking scripts/styles - defer scripts and inline critical CSS",
+         'page_weight'),
+    Rule('uncompressed-text', 'Performance', 'medium',
+         lambda seo, perf: _weight(perf)['compressed'] < _weight(perf)['compressible'],
+         lambda seo, perf: f"{_weight(perf)['compressible'] - _weight(perf)['compressed']} text responses are served uncompressed - enable gzip or Brotli",
+         'page_weight'),
+    Rule('missing-cache-headers', 'Performance', 'low',
+         lambda seo, perf: 0 < _weight(perf)['resources_measured'] and _weight(perf)['cacheable'] < _weight(perf)['resources_measured'],
+         lambda seo, perf: f"{_weight(perf)['resources_measured'] - _weight(perf)['cacheable']} assets lack cache headers - set Cache-Control max-age",
+         'page_weight'),
+
+    # General best practices, listed for every site
+    Rule('content-titles', 'SEO & Content', 'low', None, "Create descriptive, unique titles for each page (50-60 chars)"),
+    Rule('content-meta-descriptions', 'SEO & Content', 'low', None,
+         "Write engaging meta descriptions with target keywords (150-160 chars)"),
+    Rule('content-internal-links', 'SEO & Content', 'low', None,
+         "Use internal linking to improve crawlability and user navigation"),
+    Rule('images-modern-formats', 'Performance', 'low', None, "Optimize images (compress, use modern formats like WebP)"),
+    Rule('images-lazy-loading', 'Performance', 'low', None, "Implement lazy loading for images below the fold"),
+    Rule('gzip', 'Technical', 'low', None, "Enable GZIP compression to reduce file transfer sizes"),
+    Rule('minify', 'Technical', 'low', None, "Minify CSS and JavaScript files to reduce load times"),
+    Rule('browser-caching', 'Technical', 'low', None, "Use browser caching to improve repeat visitor load times"),
+    Rule('structured-data', 'Technical', 'low', None, "Implement structured data (Schema.org) for better rich snippets"),
+    Rule('https', 'Technical', 'low', None, "Implement SSL/HTTPS for secure data transmission"),
+    Rule('mobile-responsive', 'User Experience', 'low', None, "Ensure mobile responsiveness across all devices"),
+    Rule('navigation', 'User Experience', 'low', None, "Ensure clear navigation hierarchy on all pages"),
+    Rule('readable-fonts', 'User Experience', 'low', None, "Use readable fonts (minimum 16px for body text)"),
+    Rule('call-to-action', 'User Experience', 'low', None, "Implement a clear call-to-action (CTA) strategy"),
+    Rule('mobile-first', 'User Experience', 'low', None, "Design mobile-first experience for growing mobile traffic"),
+    Rule('above-the-fold', 'User Experience', 'low', None, "Reduce bounce rate with engaging above-the-fold content"),
+]
+
+
+class RuleSet:
+    """Rules compiled for evaluation in one pass.
+
+    Rules are validated and put in report order (category, then severity,
+    then declaration order) once, so evaluate() returns its results already
+    sorted. Rules without a condition are built into their Recommendation
+    up front and only copied into the result.
+    """
+
+    def __init__(self, rules):
+        seen = set()
+        for rule in rules:
+            if rule.id in seen:
+                raise ValueError(f"Duplicate recommendation rule: {rule.id}")
+            if rule.category not in CATEGORIES:
+                raise ValueError(f"Rule {rule.id} has unknown category {rule.category!r}")
+            if rule.severity not in SEVERITIES:
+                raise ValueError(f"Rule {rule.id} has unknown severity {rule.severity!r}")
+            seen.add(rule.id)
+
+        order = {rule.id: i for i, rule in enumerate(rules)}
+        ordered = sorted(rules, key=lambda r: (CATEGORIES.index(r.category), SEVERITIES.index(r.severity), order[r.id]))
+        # (rule, its Recommendation if the text is fixed)
+        self._compiled = [(rule, None if callable(rule.text) else
+                           Recommendation(rule.id, rule.category, rule.severity, rule.text))
+                          for rule in ordered]
+        self.rules = ordered
+
+    def evaluate(self, seo, performance):
+        results = []
+        for rule, static in self._compiled:
+            if rule.requires and not performance.get(rule.requires):
+                continue
+            if rule.when is not None and not rule.when(seo, performance):
+                continue
+            results.append(static or Recommendation(rule.id, rule.category, rule.severity, rule.text(seo, performance)))
+        return results
+
+
+# Compiled at import; render workers import this once and reuse it for every report
+DEFAULT_RULES = RuleSet(RULES)
+
+
+def generate_recommendations(seo, performance, rules=DEFAULT_RULES):
+    """Recommendations for one analysis, in report order"""
+    return rules.evaluate(seo, performance)
+
+
+def by_category(recommendations):
+    """Group recommendations under every category (empty ones included), keeping their order"""
+    grouped = {category: [] for category in CATEGORIES}
+    for rec in recommendations:
+        grouped[rec.category].append(rec)
+    return grouped
@@ -0,0 +1,171 @@
+import atexit
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from metrics import stage_seconds
+from singleflight import SingleFlight
+
+# PDF/chart rendering runs in its own processes so reportlab layout and
+# matplotlib rasterization don't compete with request threads for the GIL.
+# PDF_WORKERS=0 renders in the calling thread instead.
+PDF_WORKERS = int(os.environ.get('PDF_WORKERS', 2))
+PDF_TIMEOUT = float(os.environ.get('PDF_TIMEOUT', 120))
+# Start the render workers in the background at boot instead of on the first report
+PDF_WARM_START = os.environ.get('PDF_WARM_START', '0').lower() in ('1', 'true', 'yes')
+# Charts of recent analyses kept for other recipients of the same analysis
+PDF_CHART_CACHE = int(os.environ.get('PDF_CHART_CACHE', 32))
+PDF_CHART_TTL = float(os.environ.get('PDF_CHART_TTL', 300))
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+# The warm-start thread and job workers may all ask for the pool first
+_pool_lock = threading.Lock()
+
+
+def _context():
+    # forkserver: workers are forked from a clean server that has already
+    # imported the rendering stack, never from the threaded web process
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context('forkserver')
+        ctx.set_forkserver_preload(['pdf_report'])
+        return ctx
+    return multiprocessing.get_context('spawn')
+
+
+def _init_worker():
+    # Runs in the worker; the web process never imports the rendering stack
+    import pdf_report
+    pdf_report.init_worker()
+
+
+def _ready():
+    return os.getpid()
+
+
+def get_pool():
+    global _pool
+    if _pool is not None:
+        return _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=_context(),
+                                        initializer=_init_worker)
+            atexit.register(shutdown)
+            logger.info("PDF render pool started with %d workers", PDF_WORKERS)
+        return _pool
+
+
+def _replace_pool(broken):
+    global _pool
+    with _pool_lock:
+        # Another thread may have replaced it already
+        if _pool is broken:
+            broken.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _render(seo, performance, user_email, reports_dir, report_id, trend=None, charts=None):
+    import pdf_report
+    stage_times = {}
+    charts = dict(charts or {})
+    pdf_path = pdf_report.generate_pdf_report(seo, performance, user_email, reports_dir, report_id, stage_times,
+                                              trend, charts)
+    return pdf_path, stage_times, charts
+
+
+def _submit(*args):
+    if PDF_WORKERS <= 0:
+        return _render(*args)
+    pool = get_pool()
+    try:
+        return pool.submit(_render, *args).result(timeout=PDF_TIMEOUT)
+    except BrokenProcessPool:
+        # A worker died (OOM, a crash in native code) and took the pool with
+        # it; start a new one and try once more
+        logger.warning("PDF render pool broke, restarting it")
+        _replace_pool(pool)
+        return get_pool().submit(_render, *args).result(timeout=PDF_TIMEOUT)
+
+
+# Everything in a report except the recipient depends only on the analysis,
+# so its charts (the expensive part) are drawn once and shared: concurrent
+# renders of the same analysis wait for the first one, and later ones reuse
+# its charts from a small cache. Each recipient still gets its own layout.
+_chart_cache = OrderedDict()  # analysis digest -> (stored at, {name: PNG bytes})
+_chart_lock = threading.Lock()
+_chart_flight = SingleFlight('pdf')
+
+
+def _digest(seo, performance, trend):
+    payload = json.dumps([seo, performance, trend], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _cached_charts(key):
+    with _chart_lock:
+        entry = _chart_cache.get(key)
+        if entry is None or time.monotonic() - entry[0] > PDF_CHART_TTL:
+            return None
+        _chart_cache.move_to_end(key)
+        return entry[1]
+
+
+def _store_charts(key, charts):
+    if PDF_CHART_CACHE <= 0:
+        return
+    with _chart_lock:
+        _chart_cache[key] = (time.monotonic(), charts)
+        _chart_cache.move_to_end(key)
+        while len(_chart_cache) > PDF_CHART_CACHE:
+            _chart_cache.popitem(last=False)
+
+
+def render_pdf(seo, performance, user_email, reports_dir, report_id=None, trend=None):
+    """Render a report and return its path, or its bytes when ``reports_dir`` is None.
+    Only the small result dicts (and then the finished PDF) cross processes."""
+    key = _digest(seo, performance, trend)
+    charts = _cached_charts(key)
+    if charts is None:
+        (pdf_path, stage_times, charts), shared = _chart_flight.do(
+            key, _submit, seo, performance, user_email, reports_dir, report_id, trend, None)
+        if not shared:
+            _store_charts(key, charts)
+            _observe(stage_times)
+            return pdf_path
+        # That render was for another recipient; lay out ours with its charts
+    pdf_path, stage_times, _ = _submit(seo, performance, user_email, reports_dir, report_id, trend, charts)
+    _observe(stage_times)
+    return pdf_path
+
+
+def _observe(stage_times):
+    # Chart time is measured in the worker process and recorded here
+    if 'chart' in stage_times:
+        stage_seconds.observe(stage_times['chart'], stage='chart')
+
+
+def warm_start():
+    """Spawn every render worker now, so the first report doesn't pay for process
+    start-up and the matplotlib/reportlab imports"""
+    if PDF_WORKERS <= 0:
+        return
+    futures = [get_pool().submit(_ready) for _ in range(PDF_WORKERS)]
+    for future in futures:
+        future.result(timeout=PDF_TIMEOUT)
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
@@ -0,0 +1,150 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+# Retention policy (overridable through the environment); 0 disables a limit
+REPORT_MAX_AGE_DAYS = float(os.environ.get('REPORT_MAX_AGE_DAYS', 30))
+REPORT_DISK_BUDGET_MB = float(os.environ.get('REPORT_DISK_BUDGET_MB', 500))
+
+# report_<sanitized email>_<YYYYmmdd_HHMMSS>[_<id>].pdf, as written by pdf_report
+_LEGACY_NAME = re.compile(r'^report_(?:(?P<who>.+)_)?(?P<ts>\d{8}_\d{6})(?:_[0-9a-f]+)?\.pdf$')
+
+
+def normalize_recipient(email):
+    return email.strip().lower()
+
+
+def sanitize_email(email):
+    return ''.join([c if c.isalnum() else '_' for c in email])
+
+
+def report_filename(email, report_id=None):
+    # Includes email and job ID so same-second reports don't collide
+    suffix = f"_{report_id[:12]}" if report_id else ""
+    return f"report_{sanitize_email(email)}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{suffix}.pdf"
+
+
+class ReportIndex:
+    """SQLite index of generated PDFs, keyed by recipient and job ID.
+
+    Lookups go through B-tree indexes instead of listing REPORTS_DIR, and
+    recipients match exactly, so "a_b_com" no longer finds "xa_b_com".
+    """
+
+    def __init__(self, reports_dir, path=None):
+        self.reports_dir = reports_dir
+        self.path = path or os.path.join(reports_dir, 'index.sqlite3')
+        self._local = threading.local()
+        conn = self._connect()
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS reports (
+                    id INTEGER PRIMARY KEY,
+                    recipient TEXT NOT NULL,
+                    job_id TEXT,
+                    url TEXT,
+                    filename TEXT NOT NULL UNIQUE,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS reports_recipient ON reports (recipient, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS reports_job ON reports (job_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS reports_created ON reports (created_at)")
+            empty = conn.execute("SELECT COUNT(*) FROM reports").fetchone()[0] == 0
+        if empty:
+            self._backfill()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _backfill(self):
+        # One-off import of reports written before the index existed. Only
+        # the sanitized address survives in those names, so they are stored
+        # under a "legacy:" key and matched exactly on that.
+        rows = []
+        for name in os.listdir(self.reports_dir):
+            match = _LEGACY_NAME.match(name)
+            if not match:
+                continue
+            path = os.path.join(self.reports_dir, name)
+            stat = os.stat(path)
+            rows.append((f"legacy:{match.group('who') or ''}", name, stat.st_size, stat.st_mtime))
+        if rows:
+            with self._connect() as conn:
+                conn.executemany("INSERT OR IGNORE INTO reports (recipient, filename, size, created_at) VALUES (?, ?, ?, ?)", rows)
+            print(f"Report index: imported {len(rows)} existing reports")
+
+    def add(self, recipient, filename, job_id=None, url=None):
+        size = os.path.getsize(os.path.join(self.reports_dir, filename))
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO reports (recipient, job_id, url, filename, size, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                         (normalize_recipient(recipient), job_id, url, filename, size, time.time()))
+        self.enforce_retention()
+
+    def _first_existing(self, rows):
+        # Skip (and forget) entries whose file was removed behind our back
+        for row in rows:
+            if os.path.exists(os.path.join(self.reports_dir, row['filename'])):
+                return dict(row)
+            self._delete_rows([row])
+        return None
+
+    def latest(self, recipient):
+        conn = self._connect()
+        for key in (normalize_recipient(recipient), f"legacy:{sanitize_email(recipient)}"):
+            rows = conn.execute("SELECT * FROM reports WHERE recipient = ? ORDER BY created_at DESC LIMIT 5", (key,)).fetchall()
+            row = self._first_existing(rows)
+            if row:
+                return row
+        return None
+
+    def by_job(self, job_id):
+        rows = self._connect().execute("SELECT * FROM reports WHERE job_id = ? ORDER BY created_at DESC LIMIT 1", (job_id,)).fetchall()
+        return self._first_existing(rows)
+
+    def _delete_rows(self, rows):
+        for row in rows:
+            try:
+                os.remove(os.path.join(self.reports_dir, row['filename']))
+            except FileNotFoundError:
+                pass
+        with self._connect() as conn:
+            conn.executemany("DELETE FROM reports WHERE id = ?", [(row['id'],) for row in rows])
+
+    def enforce_retention(self, max_age_days=None, disk_budget_mb=None):
+        """Delete reports older than the age limit, then oldest-first until under the disk budget"""
+        max_age_days = REPORT_MAX_AGE_DAYS if max_age_days is None else max_age_days
+        disk_budget_mb = REPORT_DISK_BUDGET_MB if disk_budget_mb is None else disk_budget_mb
+        conn = self._connect()
+        removed = 0
+        if max_age_days > 0:
+            cutoff = time.time() - max_age_days * 86400
+            old = conn.execute("SELECT id, filename, size FROM reports WHERE created_at < ?", (cutoff,)).fetchall()
+            self._delete_rows(old)
+            removed += len(old)
+        if disk_budget_mb > 0:
+            budget = int(disk_budget_mb * 1024 * 1024)
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM reports").fetchone()[0]
+            if total > budget:
+                doomed = []
+                for row in conn.execute("SELECT id, filename, size FROM reports ORDER BY created_at"):
+                    if total <= budget:
+                        break
+                    doomed.append(row)
+                    total -= row['size']
+                self._delete_rows(doomed)
+                removed += len(doomed)
+        if removed:
+            print(f"Report retention: removed {removed} old reports")
+        return removed
@@ -0,0 +1,37 @@
+# Score formulas and status thresholds shared by the single-URL path
+# (app.py, pdf_report.py) and the vectorized fleet scoring in fleet.py.
+# Pure Python so the web process can import it without NumPy.
+
+# Performance score bands
+GOOD_SCORE = 80
+FAIR_SCORE = 60
+MIN_SCORE = 10
+# Response time (p50, ms) reported as fast
+FAST_RESPONSE_MS = 1000
+# Deep mode blends server speed with page weight
+TIMING_SHARE = 0.6
+PAGE_WEIGHT_SHARE = 0.4
+
+
+def compute_performance_score(timings, latency=None):
+    # Waiting for the first byte (DNS + connect + TLS + server time) is what users
+    # feel first; body transfer counts half as much since it overlaps rendering.
+    # With repeated samples the medians are used, so one slow handshake or
+    # hiccup doesn't swing the score
+    if latency:
+        timings = {'ttfb': latency['ttfb']['p50'], 'download': latency['download']['p50']}
+    penalty = timings['ttfb'] / 10 + timings['download'] / 20
+    return max(MIN_SCORE, min(100, int(100 - penalty)))
+
+
+def blend_page_weight(timing_score, weight_score):
+    # Server speed and page weight both decide how fast the page feels
+    return round(TIMING_SHARE * timing_score + PAGE_WEIGHT_SHARE * weight_score)
+
+
+def performance_rating(score):
+    return 'Good' if score >= GOOD_SCORE else 'Fair' if score >= FAIR_SCORE else 'Needs Work'
+
+
+def response_time_rating(response_time):
+    return 'Fast' if response_time < FAST_RESPONSE_MS else 'Slow'
@@ -0,0 +1,49 @@
+import threading
+from concurrent.futures import Future
+
+from metrics import Counter
+
+coalesced = Counter('webanalyzer_coalesced_total', 'Calls that shared another in-flight call\'s result', ['kind'])
+
+
+class SingleFlight:
+    """At most one call per key at a time.
+
+    The first caller for a key runs the function; callers arriving while it
+    runs wait for it and get the same result (or exception) instead of
+    repeating the work. Nothing is kept once the call finishes, so this
+    only merges overlapping calls; caching is left to the caller.
+    """
+
+    def __init__(self, kind):
+        self.kind = kind
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args, **kwargs):
+        """Return (result, shared); ``shared`` is True for callers that waited on another's call"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+        if not leader:
+            coalesced.inc(kind=self.kind)
+            return future.result(), True
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,62 @@
+"""Standalone consumer for the durable job queue (JOB_BACKEND=sqlite).
+
+Runs queued /analyze, /crawl and batch report jobs from the same
+JOB_DB_PATH database the web process writes to. Start as many as the
+machine's cores allow; each claims jobs independently and a job left by a
+killed worker is picked up again once its lease expires. To leave all the
+work to these processes, run the web process with JOB_WORKERS=0:
+
+    JOB_WORKERS=0 gunicorn --chdir backend --workers 1 --threads 2 wsgi:app
+    WORKER_THREADS=2 python backend/worker.py
+
+The database is a local file, so workers must run on the same machine as
+the web process. SIGTERM or Ctrl-C lets running jobs finish before exiting.
+
+    python backend/worker.py --dead-letters    # list permanently failed jobs
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run jobs from the durable job queue")
+    # Not JOB_WORKERS: that is typically 0 here, for the web process
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('WORKER_THREADS', 2)),
+                        help="jobs run at once by this process (default: WORKER_THREADS, or 2)")
+    parser.add_argument('--dead-letters', action='store_true', help="print dead-lettered jobs as JSON and exit")
+    args = parser.parse_args()
+    if args.threads < 1:
+        parser.error("--threads (WORKER_THREADS) must be at least 1")
+
+    # Importing the app registers the job functions with its queue
+    from app import job_queue
+    from jobs import DurableQueue
+    if not isinstance(job_queue, DurableQueue):
+        sys.exit("worker.py needs the durable job queue (JOB_BACKEND=sqlite)")
+
+    if args.dead_letters:
+        print(json.dumps(job_queue.dead_letters(), indent=2))
+        return
+
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    job_queue.start(args.threads)
+    print(f"Worker {os.getpid()}: {args.threads} threads on {job_queue.path}")
+    while not stopping:
+        signal.pause()
+    print(f"Worker {os.getpid()}: stopping after running jobs finish")
+    job_queue.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -234,10 +234,15 @@ analyzerForm.addEventListener('submit', async (e) => {
                 });
             }
 
-            // Start polling automatically to download when ready
+            // Follow the queued job, then download the PDF once it is ready
             if (dlStatus) {
-                dlStatus.textContent = 'Waiting for PDF... Auto-download enabled.';
-                startPollingForReport(email, dlStatus, dlBtn);
+                if (data.job_id) {
+                    dlStatus.textContent = 'Analysis queued... Auto-download enabled.';
+                    startPollingJob(data.job_id, email, dlStatus, dlBtn);
+                } else {
+                    dlStatus.textContent = 'Waiting for PDF... Auto-download enabled.';
+                    startPollingForReport(email, dlStatus, dlBtn);
+                }
             }
             console.log('Success message displayed');
             
@@ -285,8 +290,9 @@ analyzerForm.addEventListener('submit', async (e) => {
 });
 
 // Download latest PDF for an email
-async function downloadLatest(email, statusElement) {
-    const endpoint = `${API_BASE_URL}/download-latest?email=${encodeURIComponent(email)}`;
+async function downloadLatest(email, statusElement, jobId) {
+    let endpoint = `${API_BASE_URL}/download-latest?email=${encodeURIComponent(email)}`;
+    if (jobId) endpoint += `&job_id=${encodeURIComponent(jobId)}`;
     try {
         const resp = await fetch(endpoint);
         if (!resp.ok) {
@@ -320,6 +326,68 @@ async function downloadLatest(email, statusElement) {
     }
 }
 
+// Human-readable labels for job stages reported by /jobs/<id>
+const JOB_STAGE_LABELS = {
+    analyzing: 'Analyzing website...',
+    sending_summary: 'Sending summary email...',
+    generating_pdf: 'Generating PDF report...',
+    complete: 'Finishing up...'
+};
+
+// Poll the analysis job and download the PDF when it completes
+function startPollingJob(jobId, email, statusElement, buttonEl) {
+    const pollInterval = 3000; // 3s
+    const timeout = ANALYZE_TIMEOUT_MS || 300000; // fallback 5min
+    let elapsed = 0;
+    if (buttonEl) buttonEl.disabled = true;
+
+    const poll = async () => {
+        try {
+            const resp = await fetch(`${API_BASE_URL}/jobs/${encodeURIComponent(jobId)}`);
+            if (resp.ok) {
+                const job = await resp.json();
+                if (job.status === 'done') {
+                    clearInterval(intervalId);
+                    if (buttonEl) buttonEl.disabled = false;
+                    if (job.result && job.result.pdf_ready) {
+                        await downloadLatest(email, statusElement, jobId);
+                    } else {
+                        statusElement.textContent = 'Analysis finished, but the PDF could not be generated.';
+                    }
+                    return;
+                }
+                if (job.status === 'failed') {
+                    clearInterval(intervalId);
+                    if (buttonEl) buttonEl.disabled = false;
+                    statusElement.textContent = `Analysis failed: ${job.error || 'unknown error'}`;
+                    return;
+                }
+                statusElement.textContent = `${JOB_STAGE_LABELS[job.stage] || 'Waiting in queue...'} (${Math.floor(elapsed/1000)}s)`;
+            } else if (resp.status === 404) {
+                clearInterval(intervalId);
+                if (buttonEl) buttonEl.disabled = false;
+                statusElement.textContent = 'Job not found. Try manual download later.';
+                return;
+            } else {
+                statusElement.textContent = 'Error checking job status.';
+            }
+        } catch (err) {
+            console.error('Job poll error:', err);
+            statusElement.textContent = 'Error contacting server.';
+        }
+
+        elapsed += pollInterval;
+        if (elapsed >= timeout) {
+            statusElement.textContent = 'Timed out waiting for PDF. Try manual download later.';
+            if (buttonEl) buttonEl.disabled = false;
+            clearInterval(intervalId);
+        }
+    };
+
+    poll();
+    const intervalId = setInterval(poll, pollInterval);
+}
+
 // Poll backend for the report and auto-download when ready
 function startPollingForReport(email, statusElement, buttonEl) {
     const pollInterval = 5000; // 5s